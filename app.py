@@ -1,20 +1,33 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, send_file, flash
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, send_file, flash, Response, stream_with_context, abort
 from flask.json.provider import JSONProvider
 from werkzeug.security import generate_password_hash, check_password_hash
 import pandas as pd
-import openpyxl
 from datetime import datetime
 import os
-import speech_recognition as sr
 import re
-from fpdf import FPDF
 import random
 from collections import defaultdict
-import matplotlib.pyplot as plt
 from io import BytesIO
-import base64
 import numpy as np
 import os
+import time
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from table_cache import table_cache
+from data_files import (PRODUCTS_FILE, ORDERS_FILE, AI_SUGGESTIONS_FILE, DELIVERY_STATUS_FILE,
+                        MONEY_SPENT_FILE, REWARDS_FILE, USERS_FILE, required_files)
+from storage import make_storage
+from id_allocator import IdAllocator
+from insights import CoPurchaseIndex, RestockIndex, SpendingRollup
+from product_search import ProductSearchIndex
+from cart import Cart, CartStore
+from order_import import read_orders_file, import_orders
+from exports import stream_csv, stream_xlsx, XLSX_MIMETYPE
+from invoices import InvoiceCache, make_invoice, render_invoices
+from data_manifest import load_manifest, init_data, check_manifest, verify_files
+from voice_jobs import VoiceJobQueue, make_recognizer
+from voice_grammar import parse_voice_order
+import click
 
 from json import JSONEncoder
 
@@ -34,73 +47,166 @@ app = Flask(__name__)
 app.json_encoder = CustomJSONEncoder
 app.secret_key = 'your_secret_key_here'
 
-# Data file paths
-PRODUCTS_FILE = 'data/Products.xlsx'
-ORDERS_FILE = 'data/retailer_orders.xlsx'
-AI_SUGGESTIONS_FILE = 'data/Ai_suggestion_products.xlsx'
-DELIVERY_STATUS_FILE = 'data/deliverystatus.xlsx'
-MONEY_SPENT_FILE = 'data/MoneySpent.xlsx'
-REWARDS_FILE = 'data/retailer_rewards.xlsx'
-USERS_FILE = 'data/retailer_users.xlsx'
-
-# Initialize data files if they don't exist
-if not os.path.exists('data'):
-    os.makedirs('data')
-
-required_files = {
-    PRODUCTS_FILE: ['ProductID', 'Name', 'Category', 'Price', 'Supplier', 'Stock'],
-    ORDERS_FILE: ['OrderID', 'ProductID', 'ProductName', 'Quantity', 'Price', 'Total', 'OrderDate', 'Status'],
-    AI_SUGGESTIONS_FILE: ['ProductID', 'Name', 'Category', 'Reason'],
-    DELIVERY_STATUS_FILE: ['OrderID', 'Status', 'LastUpdate', 'DeliveryAgent'],
-    MONEY_SPENT_FILE: ['TransactionID', 'Amount', 'Date', 'Description'],
-    REWARDS_FILE: ['Points', 'Badges', 'Level'],
-    USERS_FILE: ['ShopName', 'OwnerName', 'Location', 'Phone', 'Email', 'Password']
+# Bump when the data layout changes in a way required_files does not show
+DATA_SCHEMA_VERSION = 1
+MANIFEST_FILE = 'data/manifest.json'
+
+# Workers check the data directory's manifest against required_files instead
+# of probing each workbook; `flask init-data` creates or updates it. On the
+# first start against a data directory the manifest is written here.
+data_manifest = load_manifest(MANIFEST_FILE)
+if data_manifest is None:
+    data_manifest, _ = init_data(required_files, DATA_SCHEMA_VERSION, MANIFEST_FILE, if_missing=True)
+data_problems = check_manifest(data_manifest, required_files, DATA_SCHEMA_VERSION)
+for problem in data_problems:
+    print(f"Error: {problem}; run `flask init-data`")
+
+# Reads and writes go through the storage backend (NOMII_STORAGE, default: sqlite)
+storage = make_storage(required_files)
+
+# Ids come from sequences in storage; each worker reserves them a block at a time
+ID_BLOCK_SIZE = int(os.environ.get('NOMII_ID_BLOCK_SIZE', 10))
+order_ids = IdAllocator(storage, ORDERS_FILE, 'OrderID', ID_BLOCK_SIZE)
+transaction_ids = IdAllocator(storage, MONEY_SPENT_FILE, 'TransactionID', ID_BLOCK_SIZE)
+retailer_ids = IdAllocator(storage, USERS_FILE, 'RetailerID')
+
+# Dashboard insights maintained incrementally from the orders table
+copurchase = CoPurchaseIndex(storage, ORDERS_FILE)
+restock = RestockIndex(storage, ORDERS_FILE)
+spending = SpendingRollup(storage, ORDERS_FILE)
+WEEKS_SHOWN = 12
+
+# Catalog search index, rebuilt whenever the products table changes
+product_index = ProductSearchIndex(storage, PRODUCTS_FILE)
+PRODUCTS_PER_PAGE = 24
+
+# The orders view reads one page at a time, and only the columns it shows
+ORDERS_PER_PAGE = 50
+ORDER_LIST_COLUMNS = ['OrderID', 'RetailerID', 'ProductName', 'Quantity', 'Price', 'Total', 'OrderDate', 'Status']
+ORDER_STATUSES = ['Ordered', 'Pending', 'In Transit', 'Delivered']
+
+# Carts are kept server side; the session cookie only holds the cart id
+cart_store = CartStore(os.path.join('data', 'carts.db'))
+BULK_CART_MAX_LINES = 1000
+BULK_CART_MAX_QUANTITY = 10000
+
+# Downloadable tables: name -> (table, date column)
+EXPORTS = {
+    'orders': (ORDERS_FILE, 'OrderDate'),
+    'spending': (MONEY_SPENT_FILE, 'Date')
 }
 
-for file, columns in required_files.items():
-    if not os.path.exists(file):
-        df = pd.DataFrame(columns=columns)
-        df.to_excel(file, index=False)
+# Rendered invoices, named by OrderID and content hash; monthly batches
+# render the missing ones across NOMII_INVOICE_PROCESSES processes
+invoice_cache = InvoiceCache(os.path.join('data', 'invoices'),
+                             int(os.environ.get('NOMII_INVOICE_PROCESSES', 0)) or None)
 
-# Helper functions
-def get_next_id(filename, id_column):
+# Shared by dashboard requests to compute independent widgets concurrently
+dashboard_pool = ThreadPoolExecutor(max_workers=int(os.environ.get('NOMII_DASHBOARD_THREADS', 4)),
+                                    thread_name_prefix='dashboard')
+
+def refresh_order_indexes():
     try:
-        df = pd.read_excel(filename)
-        if df.empty:
-            return 1
-        return int(df[id_column].max()) + 1  # Ensure native Python int
-    except:
-        return 1
+        copurchase.refresh()
+        restock.refresh()
+        spending.refresh()
+    except Exception as e:
+        print(f"Error refreshing order indexes: {e}")
+
+# Helper functions
+@app.before_request
+def require_current_data():
+    # Requests are refused until the data directory matches required_files
+    if data_problems:
+        return "The data directory does not match this version of Nomii; run `flask init-data`", 503
 
 @app.context_processor
 def inject_now():
     return {'now': datetime.now()}
 
-def save_to_excel(data, filename):
+@app.context_processor
+def inject_cart_size():
+    return {'cart_size': len(load_cart())}
+
+def current_retailer_id():
+    # Orders, spend and rewards are partitioned by the shop's RetailerID
+    retailer_id = session.get('retailer_id')
+    if retailer_id is None and 'email' in session:
+        user = storage.find(USERS_FILE, 'Email', session['email'])
+        if user.empty:
+            return None
+        retailer_id = user.iloc[0].get('RetailerID')
+        if pd.isna(retailer_id):
+            # Accounts created before retailer ids existed get one now
+            retailer_id = new_retailer_id()
+            storage.upsert(USERS_FILE, 'Email', session['email'], {'RetailerID': retailer_id})
+        session['retailer_id'] = retailer_id
+    return retailer_id
+
+def new_retailer_id():
+    return f"R{retailer_ids.next():03}"
+
+def save_record(data, filename):
     try:
-        df = pd.read_excel(filename)
-        new_df = pd.DataFrame([data])
-        df = pd.concat([df, new_df], ignore_index=True)
-        df.to_excel(filename, index=False)
+        storage.append(filename, [data])
         return True
     except Exception as e:
         print(f"Error saving to {filename}: {e}")
         return False
 
-def get_user_orders():
+def load_cart():
+    if 'cart' in session:
+        # A cart still stored in the cookie by an older version moves server side
+        cart = Cart.load(session.pop('cart'))
+        cart.dirty.update(cart.items)
+        if cart:
+            save_cart(cart)
+        return cart
+    cart_id = session.get('cart_id')
+    return cart_store.get(cart_id) if cart_id else Cart()
+
+def save_cart(cart):
+    if 'cart_id' not in session:
+        session['cart_id'] = cart_store.new_id()
+    cart_store.put(session['cart_id'], cart)
+
+def clear_cart():
+    cart_id = session.pop('cart_id', None)
+    if cart_id:
+        cart_store.delete(cart_id)
+
+def get_user_orders(retailer_id, df=None):
     try:
-        df = pd.read_excel(ORDERS_FILE)
-        # Convert numeric columns to native Python types
-        numeric_cols = ['ProductID', 'Quantity', 'Price', 'Total']
+        if df is None:
+            df = storage.find(ORDERS_FILE, 'RetailerID', retailer_id)
+        # Convert numeric columns to native Python types (ProductID has letters)
+        numeric_cols = ['Quantity', 'Price', 'Total']
         df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric)
         return df.to_dict('records')
     except Exception as e:
         print(f"Error getting user orders: {e}")
         return []
 
+def encode_cursor(key):
+    # storage.page() keys as an opaque "date|position" query argument
+    return None if key is None else f"{key[0] or ''}|{key[1]}"
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    date, _, position = cursor.rpartition('|')
+    return (date or None, int(position))
+
+def parse_date_range(date_from, date_to):
+    # [start, end) covering both days; dates that do not parse are ignored
+    # rather than matching nothing
+    start = pd.to_datetime(date_from, errors='coerce') if date_from else None
+    end = pd.to_datetime(date_to, errors='coerce') + pd.Timedelta(days=1) if date_to else None
+    return tuple(None if d is None or pd.isna(d) else d for d in (start, end))
+
 def get_product_suggestions():
     try:
-        df = pd.read_excel(AI_SUGGESTIONS_FILE)
+        df = storage.read(AI_SUGGESTIONS_FILE)
         # Convert numeric columns to native Python types
         if 'ProductID' in df.columns:
             df['ProductID'] = df['ProductID'].astype(int)
@@ -109,54 +215,34 @@ def get_product_suggestions():
         print(f"Error getting product suggestions: {e}")
         return []
 
-def generate_restock_predictions():
+def generate_restock_predictions(retailer_id):
     try:
-        orders_df = pd.read_excel(ORDERS_FILE)
-        
-        if orders_df.empty:
-            return []
-            
-        freq_products = orders_df['ProductName'].value_counts().head(5).index.tolist()
-        recent_orders = orders_df.sort_values('OrderDate', ascending=False)
-        
         predictions = []
-        for product in freq_products:
-            last_ordered = recent_orders[recent_orders['ProductName'] == product]
-            if not last_ordered.empty:
-                days_since = (datetime.now() - last_ordered.iloc[0]['OrderDate']).days
-                if days_since > 7:
-                    predictions.append({
-                        'product': product,
-                        'message': f"Restock soon! You usually order this every {random.randint(3,5)} days",
-                        'urgency': 'high' if days_since > 14 else 'medium'
-                    })
+        for product, stats in restock.most_ordered(retailer_id, 5):
+            if stats['last'] is None:
+                continue
+            days_since = (datetime.now() - stats['last']).days
+            if days_since > 7:
+                interval = stats['interval']
+                if interval:
+                    message = f"Restock soon! You usually order this every {max(1, round(interval))} days"
+                else:
+                    message = f"Restock soon! Last ordered {days_since} days ago"
+                predictions.append({
+                    'product': product,
+                    'message': message,
+                    'urgency': 'high' if days_since > 14 else 'medium'
+                })
         
         return predictions[:3]
     except Exception as e:
         print(f"Error generating restock predictions: {e}")
         return []
 
-def generate_combo_suggestions():
+def generate_combo_suggestions(retailer_id):
     try:
-        orders_df = pd.read_excel(ORDERS_FILE)
-        
-        if orders_df.empty:
-            return []
-            
-        order_ids = orders_df['OrderID'].unique()
-        product_pairs = defaultdict(int)
-        
-        for order_id in order_ids:
-            products = orders_df[orders_df['OrderID'] == order_id]['ProductName'].tolist()
-            for i in range(len(products)):
-                for j in range(i+1, len(products)):
-                    pair = tuple(sorted([products[i], products[j]]))
-                    product_pairs[pair] += 1
-        
-        top_pairs = sorted(product_pairs.items(), key=lambda x: x[1], reverse=True)[:3]
-        
         suggestions = []
-        for pair, count in top_pairs:
+        for pair, count in copurchase.top_pairs(retailer_id, 3):
             discount = random.randint(5, 15)
             suggestions.append({
                 'products': f"{pair[0]} + {pair[1]}",
@@ -169,64 +255,20 @@ def generate_combo_suggestions():
         print(f"Error generating combo suggestions: {e}")
         return []
 
-def generate_weekly_insights():
+def generate_weekly_insights(retailer_id):
     try:
-        orders_df = pd.read_excel(ORDERS_FILE)
-        
-        if orders_df.empty:
-            return {}
-            
-        orders_df['OrderDate'] = pd.to_datetime(orders_df['OrderDate'])
-        weekly_spending = orders_df.groupby(
-            orders_df['OrderDate'].dt.to_period('W'))['Total'].sum().reset_index()
-        weekly_spending['OrderDate'] = weekly_spending['OrderDate'].astype(str)
-        
-        top_products = orders_df.groupby('ProductName')['Quantity'].sum().nlargest(5)
-        
-        avg_order_value = float(orders_df['Total'].mean())  # Convert to native float
-        order_count = int(len(orders_df['OrderID'].unique()))  # Convert to native int
-        
-        return {
-            'weekly_spending': weekly_spending.to_dict('records'),
-            'top_products': top_products.reset_index().to_dict('records'),
-            'avg_order_value': round(avg_order_value, 2),
-            'order_count': order_count
-        }
+        return spending.summary(retailer_id, weeks=WEEKS_SHOWN)
     except Exception as e:
         print(f"Error generating weekly insights: {e}")
         return {}
 
-def generate_pdf_invoice(order_data):
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=12)
-    
-    pdf.cell(200, 10, txt="Nomii - Invoice", ln=1, align='C')
-    pdf.cell(200, 10, txt=f"Order ID: {order_data['OrderID']}", ln=1, align='L')
-    pdf.cell(200, 10, txt=f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", ln=1, align='L')
-    
-    pdf.cell(200, 10, txt=f"Retailer: {session.get('shop_name')}", ln=1, align='L')
-    pdf.cell(200, 10, txt=f"Location: {session.get('location')}", ln=1, align='L')
-    
-    pdf.cell(200, 10, txt="Items:", ln=1, align='L')
-    pdf.cell(100, 10, txt="Product", border=1)
-    pdf.cell(30, 10, txt="Qty", border=1)
-    pdf.cell(30, 10, txt="Price", border=1)
-    pdf.cell(30, 10, txt="Total", border=1, ln=1)
-    
-    for item in order_data['items']:
-        pdf.cell(100, 10, txt=item['ProductName'], border=1)
-        pdf.cell(30, 10, txt=str(item['Quantity']), border=1)
-        pdf.cell(30, 10, txt=str(item['Price']), border=1)
-        pdf.cell(30, 10, txt=str(item['Total']), border=1, ln=1)
-    
-    pdf.cell(160, 10, txt="Total Amount:", border=1)
-    pdf.cell(30, 10, txt=str(order_data['total_amount']), border=1, ln=1)
-    
-    buffer = BytesIO()
-    pdf.output(buffer)
-    buffer.seek(0)
-    return buffer
+def order_invoices(df):
+    # One invoice per OrderID in df, in order of first appearance
+    orders = defaultdict(list)
+    for row in df.to_dict('records'):
+        orders[row['OrderID']].append(row)
+    return [make_invoice(order_id, rows, session.get('shop_name'), session.get('location'))
+            for order_id, rows in orders.items()]
 
 # Routes
 @app.route('/')
@@ -242,13 +284,14 @@ def login():
         password = request.form['password']
         
         try:
-            df = pd.read_excel(USERS_FILE)
-            user = df[df['Email'] == email].iloc[0]
+            user = storage.find(USERS_FILE, 'Email', email).iloc[0]
             
             if user is not None and check_password_hash(user['Password'], password):
                 session['shop_name'] = user['ShopName']
                 session['location'] = user['Location']
                 session['email'] = user['Email']
+                session.pop('retailer_id', None)
+                current_retailer_id()
                 return redirect(url_for('dashboard'))
             else:
                 return render_template('login.html', error="Invalid credentials")
@@ -262,12 +305,11 @@ def login():
 def signup():
     if request.method == 'POST':
         try:
-            df = pd.read_excel(USERS_FILE)
-            
-            if not df[df['Email'] == request.form['email']].empty:
+            if not storage.find(USERS_FILE, 'Email', request.form['email']).empty:
                 return render_template('signup.html', error="Email already registered")
             
             new_user = {
+                'RetailerID': new_retailer_id(),
                 'ShopName': request.form['shop_name'],
                 'OwnerName': request.form['owner_name'],
                 'Location': request.form['location'],
@@ -276,7 +318,7 @@ def signup():
                 'Password': generate_password_hash(request.form['password'])
             }
             
-            save_to_excel(new_user, USERS_FILE)
+            save_record(new_user, USERS_FILE)
             return redirect(url_for('login'))
         except Exception as e:
             print(f"Signup error: {e}")
@@ -289,28 +331,59 @@ def dashboard():
     if 'email' not in session:
         return redirect(url_for('login'))
     
-    orders = get_user_orders()
-    suggestions = get_product_suggestions()
-    restock_predictions = generate_restock_predictions()
-    combo_suggestions = generate_combo_suggestions()
-    weekly_insights = generate_weekly_insights()
-    
-    recent_orders = sorted(orders, key=lambda x: x['OrderDate'], reverse=True)[:5] if orders else []
+    data, timings = load_dashboard(current_retailer_id())
     
+    response = app.make_response(render_template('dashboard.html', **data))
+    # Per-widget timings, visible in the browser's network panel
+    response.headers['Server-Timing'] = ', '.join(
+        f"{name};dur={ms:.1f}" for name, ms in timings.items())
+    return response
+
+def get_delivery_statuses(orders):
     try:
-        delivery_df = pd.read_excel(DELIVERY_STATUS_FILE)
-        delivery_statuses = delivery_df[delivery_df['OrderID'].isin([o['OrderID'] for o in orders])].to_dict('records')
+        return storage.find(DELIVERY_STATUS_FILE, 'OrderID',
+                            [o['OrderID'] for o in orders]).to_dict('records')
     except Exception as e:
         print(f"Error getting delivery statuses: {e}")
-        delivery_statuses = []
+        return []
+
+def load_dashboard(retailer_id):
+    # Each source table is loaded once and shared by the widgets that need
+    # it; widgets that do not depend on each other run on the thread pool.
+    timings = {}
+    
+    def timed(name, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            timings[name] = (time.perf_counter() - start) * 1000
+    
+    orders_df = dashboard_pool.submit(timed, 'orders_table', storage.find, ORDERS_FILE, 'RetailerID', retailer_id)
+    suggestions = dashboard_pool.submit(timed, 'suggestions', get_product_suggestions)
+    # The insight widgets read from indexes; bring those up to date once
+    timed('refresh_indexes', refresh_order_indexes)
+    restock_predictions = dashboard_pool.submit(timed, 'restock', generate_restock_predictions, retailer_id)
+    combo_suggestions = dashboard_pool.submit(timed, 'combos', generate_combo_suggestions, retailer_id)
+    weekly_insights = dashboard_pool.submit(timed, 'weekly', generate_weekly_insights, retailer_id)
+    
+    try:
+        orders = timed('user_orders', get_user_orders, retailer_id, orders_df.result())
+    except Exception as e:
+        print(f"Error getting user orders: {e}")
+        orders = []
+    delivery_statuses = dashboard_pool.submit(timed, 'delivery', get_delivery_statuses, orders)
+    recent_orders = sorted(orders, key=lambda x: x['OrderDate'], reverse=True)[:5] if orders else []
     
-    return render_template('dashboard.html', 
-                         recent_orders=recent_orders,
-                         suggestions=suggestions,
-                         restock_predictions=restock_predictions,
-                         combo_suggestions=combo_suggestions,
-                         weekly_insights=weekly_insights,
-                         delivery_statuses=delivery_statuses)
+    data = {
+        'recent_orders': recent_orders,
+        'suggestions': suggestions.result(),
+        'restock_predictions': restock_predictions.result(),
+        'combo_suggestions': combo_suggestions.result(),
+        'weekly_insights': weekly_insights.result(),
+        'delivery_statuses': delivery_statuses.result()
+    }
+    return data, timings
 
 @app.route('/products')
 def products():
@@ -319,67 +392,57 @@ def products():
     
     search_query = request.args.get('search', '')
     category_filter = request.args.get('category', '')
+    page = request.args.get('page', 1, type=int)
     
     try:
-        df = pd.read_excel(PRODUCTS_FILE)
-        # Remove the int conversion since ProductID has letters
-        # df['ProductID'] = df['ProductID'].astype(int)  # Remove this line
-        df['Price'] = df['Price'].astype(float)
-        
-        if search_query:
-            df = df[df['Name'].str.contains(search_query, case=False)]
-        if category_filter:
-            df = df[df['Category'] == category_filter]
-            
-        categories = df['Category'].unique().tolist()
-        products = df.to_dict('records')
+        results = product_index.search(search_query, category_filter, page, PRODUCTS_PER_PAGE)
+        categories = product_index.categories()
     except Exception as e:
         print(f"Error getting products: {e}")
         flash("Error loading products. Please try again.", "danger")
         categories = []
-        products = []
+        results = {'products': [], 'total': 0, 'page': 1, 'pages': 1, 'per_page': PRODUCTS_PER_PAGE}
     
     return render_template('products.html', 
-                         products=products, 
+                         products=results['products'], 
                          categories=categories,
                          search_query=search_query,
+                         page=results['page'],
+                         pages=results['pages'],
+                         total=results['total'],
                          selected_category=category_filter)
 
+@app.route('/products/search')
+def search_products():
+    # Ranked matches as JSON, for search-as-you-type
+    if 'email' not in session:
+        return jsonify({'success': False, 'error': 'Not logged in'})
+
+    try:
+        results = product_index.search(request.args.get('q', ''),
+                                       request.args.get('category', ''),
+                                       request.args.get('page', 1, type=int),
+                                       min(max(request.args.get('per_page', PRODUCTS_PER_PAGE, type=int), 1), 100))
+        return jsonify({'success': True, **results})
+    except Exception as e:
+        print(f"Error searching products: {e}")
+        return jsonify({'success': False, 'error': str(e)})
+
 @app.route('/add_to_cart', methods=['POST'])
 def add_to_cart():
     if 'email' not in session:
         return jsonify({'success': False, 'error': 'Not logged in'})
     
     product_id = request.form.get('product_id')  # This will be in format "P001", "P002", etc.
-    quantity = int(request.form.get('quantity', 1))
     
     try:
-        df = pd.read_excel(PRODUCTS_FILE)
+        quantity = int(request.form.get('quantity', 1))
         # Match the ProductID as string without any conversion
-        product = df[df['ProductID'] == product_id].iloc[0]
-        
-        cart = session.get('cart', [])
-        
-        # Check if product already exists in cart
-        found = False
-        for item in cart:
-            if item['ProductID'] != product_id:
-                item['Quantity'] += quantity
-                item['Total'] = round(float(item['Quantity'] * float(item['Price'])), 2)
-                found = True
-                break
-        
-        # If not found, add new item to cart
-        if not found:
-            cart.append({
-                 # Keep as string
-                'ProductName': product['Name'],
-                'Quantity': quantity,
-                'Price': round(float(product['Price']), 2),
-                'Total': round(float(quantity * float(product['Price'])), 2)
-            })
+        product = storage.find(PRODUCTS_FILE, 'ProductID', product_id).iloc[0]
         
-        session['cart'] = cart
+        cart = load_cart()
+        cart.add(product_id, product['Name'], product['Price'], quantity)
+        save_cart(cart)
         return jsonify({
             'success': True, 
             'cart_size': len(cart),
@@ -392,15 +455,90 @@ def add_to_cart():
     except Exception as e:
         print(f"Error adding to cart: {e}")
         return jsonify({'success': False, 'error': 'Failed to add product to cart'})
+
+def read_bulk_lines():
+    # Lines of a bulk request, from a CSV upload ("file") or a JSON list of
+    # {"product_id": ..., "quantity": ...} objects, numbered from 1
+    if 'file' in request.files:
+        df = pd.read_csv(request.files['file'], dtype=str, skipinitialspace=True)
+    else:
+        payload = request.get_json(silent=True)
+        items = payload.get('items') if isinstance(payload, dict) else payload
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            raise ValueError("expected a CSV file or a JSON list of items")
+        df = pd.DataFrame(items, dtype=object)
+
+    # Accept ProductID / product_id / "Product ID" and Quantity / qty. Items
+    # may spell a column differently; such columns are merged, and the first
+    # spelling given on a line wins.
+    names = [re.sub(r'[^a-z]', '', str(c).lower()) for c in df.columns]
+    names = [{'productid': 'ProductID', 'quantity': 'Quantity', 'qty': 'Quantity'}.get(n, n) for n in names]
+    df = pd.DataFrame({name: df.loc[:, [n == name for n in names]].bfill(axis=1).iloc[:, 0]
+                       for name in dict.fromkeys(names)})
+    if 'ProductID' not in df.columns:
+        raise ValueError("no ProductID column")
+    if 'Quantity' not in df.columns:
+        df['Quantity'] = 1
+    # JSON true/false would otherwise count as 1/0
+    df['Quantity'] = df['Quantity'].map(lambda q: None if isinstance(q, bool) else q)
+    df['Line'] = np.arange(1, len(df) + 1)
+    return df[['Line', 'ProductID', 'Quantity']]
+
+@app.route('/add_to_cart/bulk', methods=['POST'])
+def add_to_cart_bulk():
+    if 'email' not in session:
+        return jsonify({'success': False, 'error': 'Not logged in'})
+
+    try:
+        lines = read_bulk_lines()
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Could not read items: {str(e)}'})
+    if len(lines) > BULK_CART_MAX_LINES:
+        return jsonify({'success': False, 'error': f'At most {BULK_CART_MAX_LINES} lines per request'})
+
+    try:
+        # Every ProductID is resolved against the catalog in one lookup and join
+        lines['ProductID'] = lines['ProductID'].where(lines['ProductID'].isna(),
+                                                      lines['ProductID'].astype(str).str.strip())
+        lines['Quantity'] = pd.to_numeric(lines['Quantity'], errors='coerce')
+        products = storage.find(PRODUCTS_FILE, 'ProductID', lines['ProductID'].dropna().unique().tolist())
+        lines = lines.merge(products[['ProductID', 'Name', 'Price']].drop_duplicates('ProductID'),
+                            on='ProductID', how='left', indicator=True)
+
+        unknown = lines['_merge'] == 'left_only'
+        bad_quantity = (~(lines['Quantity'] > 0) | (lines['Quantity'] % 1 != 0) |
+                        (lines['Quantity'] > BULK_CART_MAX_QUANTITY))
+        lines['Error'] = np.select([lines['ProductID'].isna(), unknown, bad_quantity],
+                                   ['Missing ProductID', 'Product not found', 'Invalid quantity'], '')
+        failed = lines[lines['Error'] != '']
+        valid = lines[lines['Error'] == '']
+
+        cart = load_cart()
+        for product_id, name, price, quantity in valid[['ProductID', 'Name', 'Price', 'Quantity']].itertuples(index=False):
+            cart.add(product_id, name, price, int(quantity))
+        if len(valid):
+            save_cart(cart)
+
+        return jsonify({
+            'success': True,
+            'added': len(valid),
+            'errors': [{'line': int(line), 'product_id': None if pd.isna(product_id) else product_id, 'error': error}
+                       for line, product_id, error in failed[['Line', 'ProductID', 'Error']].itertuples(index=False)],
+            'cart_size': len(cart),
+            'total': cart.total
+        })
+    except Exception as e:
+        print(f"Error adding items to cart: {e}")
+        return jsonify({'success': False, 'error': 'Failed to add products to cart'})
+
 @app.route('/cart')
 def view_cart():
     if 'email' not in session:
         return redirect(url_for('login'))
     
-    cart = session.get('cart', [])
-    total = sum(float(item['Total']) for item in cart)  # Ensure float
+    cart = load_cart()
     
-    return render_template('cart.html', cart=cart, total=total)
+    return render_template('cart.html', cart=cart.lines(), total=cart.total)
 
 @app.route('/update_cart', methods=['POST'])
 def update_cart():
@@ -410,54 +548,45 @@ def update_cart():
     product_id = request.form.get('product_id')
     quantity = int(request.form.get('quantity', 1))
     
-    cart = session.get('cart', [])
-    
-    for item in cart:
-        if item['ProductID'] == product_id:
-            if quantity <= 0:
-                cart.remove(item)
-            else:
-                item['Quantity'] = quantity
-                item['Total'] = float(quantity * float(item['Price']))  # Ensure float
-            break
-    
-    session['cart'] = cart
-    return jsonify({'success': True, 'cart_size': len(cart)})
+    cart = load_cart()
+    if cart.set_quantity(product_id, quantity):
+        save_cart(cart)
+    return jsonify({'success': True, 'cart_size': len(cart), 'total': cart.total})
 
 @app.route('/place_order', methods=['POST'])
 def place_order():
     if 'email' not in session:
         return redirect(url_for('login'))
     
-    cart = session.get('cart', [])
+    cart = load_cart()
     if not cart:
         return redirect(url_for('view_cart'))
     
-    order_id = get_next_id(ORDERS_FILE, 'OrderID')
+    retailer_id = current_retailer_id()
+    order_id = order_ids.next()
     order_date = datetime.now()
     
     try:
-        for item in cart:
-            order_data = {
-                'OrderID': order_id,
-                'ProductID': int(item['ProductID']),  # Ensure native int
-                'ProductName': item['ProductName'],
-                'Quantity': int(item['Quantity']),  # Ensure native int
-                'Price': float(item['Price']),  # Ensure native float
-                'Total': float(item['Total']),  # Ensure native float
-                'OrderDate': order_date,
-                'Status': 'Ordered'
-            }
-            save_to_excel(order_data, ORDERS_FILE)
-        
-        total_amount = sum(float(item['Total']) for item in cart)  # Ensure float
+        order_rows = [{
+            'OrderID': order_id,
+            'RetailerID': retailer_id,
+            'ProductID': item['ProductID'],  # IDs are strings like "P001"
+            'ProductName': item['ProductName'],
+            'Quantity': int(item['Quantity']),  # Ensure native int
+            'Price': float(item['Price']),  # Ensure native float
+            'Total': float(item['Total']),  # Ensure native float
+            'OrderDate': order_date,
+            'Status': 'Ordered'
+        } for item in cart.lines()]
+        
+        total_amount = cart.total
         transaction_data = {
-            'TransactionID': get_next_id(MONEY_SPENT_FILE, 'TransactionID'),
+            'TransactionID': transaction_ids.next(),
+            'RetailerID': retailer_id,
             'Amount': float(total_amount),  # Ensure native float
             'Date': order_date,
             'Description': f"Order #{order_id}"
         }
-        save_to_excel(transaction_data, MONEY_SPENT_FILE)
         
         delivery_status = {
             'OrderID': order_id,
@@ -465,15 +594,25 @@ def place_order():
             'LastUpdate': order_date,
             'DeliveryAgent': f"Agent {random.randint(1000, 9999)}"
         }
-        save_to_excel(delivery_status, DELIVERY_STATUS_FILE)
-        
-        update_rewards(total_amount)
         
-        session.pop('cart', None)
+        # Every row of the checkout is committed together in one write
+        batch = [
+            ('append', ORDERS_FILE, order_rows),
+            ('append', MONEY_SPENT_FILE, [transaction_data]),
+            ('append', DELIVERY_STATUS_FILE, [delivery_status])
+        ]
+        # Rewards are credited from the row as it is inside the write, so
+        # concurrent checkouts each add their points
+        batch.append(('update', REWARDS_FILE,
+                      ('RetailerID', retailer_id, lambda row: update_rewards(row, total_amount))))
+        storage.write_batch(batch)
+        refresh_order_indexes()
+        
+        clear_cart()
         
         invoice_data = {
             'OrderID': order_id,
-            'items': cart,
+            'items': cart.lines(),
             'total_amount': total_amount,
             'order_date': order_date
         }
@@ -483,150 +622,235 @@ def place_order():
         print(f"Error placing order: {e}")
         return render_template('cart.html', error=f"Order failed: {str(e)}")
 
-def update_rewards(amount):
+def update_rewards(row, amount):
+    # Returns the rewards row (None for a new retailer) after crediting amount
     try:
-        df = pd.read_excel(REWARDS_FILE)
-        
         points_earned = int(float(amount) / 10)  # Ensure proper calculation
         
-        if df.empty:
-            new_rewards = {
+        if row is None:
+            return {
                 'Points': points_earned,
                 'Badges': 'Newbie',
                 'Level': 1
             }
-            save_to_excel(new_rewards, REWARDS_FILE)
-        else:
-            df.at[0, 'Points'] = int(df.at[0, 'Points']) + points_earned  # Ensure native int
-            
-            if int(df.at[0, 'Points']) >= 100 and int(df.at[0, 'Level']) == 1:
-                df.at[0, 'Level'] = 2
-                df.at[0, 'Badges'] = 'Bronze'
-            elif int(df.at[0, 'Points']) >= 500 and int(df.at[0, 'Level']) == 2:
-                df.at[0, 'Level'] = 3
-                df.at[0, 'Badges'] = 'Silver'
-            elif int(df.at[0, 'Points']) >= 1000 and int(df.at[0, 'Level']) == 3:
-                df.at[0, 'Level'] = 4
-                df.at[0, 'Badges'] = 'Gold'
-            
-            df.to_excel(REWARDS_FILE, index=False)
+        
+        points = int(row['Points']) + points_earned  # Ensure native int
+        level = int(re.search(r'\d+', str(row['Level'])).group())  # "2" or "Level 2"
+        badges = row['Badges']
+        
+        if points >= 100 and level == 1:
+            level, badges = 2, 'Bronze'
+        elif points >= 500 and level == 2:
+            level, badges = 3, 'Silver'
+        elif points >= 1000 and level == 3:
+            level, badges = 4, 'Gold'
+        
+        return {'Points': points, 'Badges': badges, 'Level': level}
     except Exception as e:
         print(f"Error updating rewards: {e}")
+        return None
 
 @app.route('/orders')
 def orders():
     if 'email' not in session:
         return redirect(url_for('login'))
     
+    cursor = request.args.get('after', '')
+    status_filter = request.args.get('status', '')
+    date_from = request.args.get('date_from', '')
+    date_to = request.args.get('date_to', '')
     try:
-        # Read all orders without any filtering
-        orders_df = pd.read_excel(ORDERS_FILE)
-        
-        # Convert to list of dictionaries
-        all_orders = orders_df.to_dict('records')
-
-        return render_template('orders.html', 
-                            orders=all_orders,
-                            status_filter='',
-                            date_from='',
-                            date_to='')
-    
+        # Filters are answered from the date-sorted, status-coded order index
+        start, end = parse_date_range(date_from, date_to)
+        equals = {'Status': status_filter} if status_filter else None
+        # One page of this retailer's orders, newest first, displayed columns only
+        orders_df, next_key = storage.page(ORDERS_FILE, 'RetailerID', current_retailer_id(), 'OrderDate',
+                                           decode_cursor(cursor), ORDERS_PER_PAGE, ORDER_LIST_COLUMNS,
+                                           equals=equals, start=start, end=end)
+        next_cursor = encode_cursor(next_key)
     except Exception as e:
         print(f"Error loading orders: {e}")
-        return render_template('orders.html', 
-                            orders=[],
-                            status_filter='',
-                            date_from='',
-                            date_to='')
-
-@app.route('/download_invoice/<int:order_id>')
+        orders_df, next_cursor = pd.DataFrame(columns=ORDER_LIST_COLUMNS), None
+
+    if request.args.get('format') == 'json':
+        orders_df['OrderDate'] = orders_df['OrderDate'].map(lambda d: None if pd.isna(d) else d.isoformat())
+        return jsonify({'orders': orders_df.astype(object).where(orders_df.notna(), None).to_dict('records'),
+                        'next': next_cursor})
+
+    # Undated orders (listed last) have NaT, which the template would take for a date
+    orders_df['OrderDate'] = orders_df['OrderDate'].astype(object).where(orders_df['OrderDate'].notna(), None)
+    return render_template('orders.html', 
+                        orders=orders_df.to_dict('records'),
+                        cursor=cursor,
+                        next_cursor=next_cursor,
+                        statuses=ORDER_STATUSES,
+                        status_filter=status_filter,
+                        date_from=date_from,
+                        date_to=date_to)
+
+@app.route('/export/<name>.<fmt>')
+def export_table(name, fmt):
+    if 'email' not in session:
+        return redirect(url_for('login'))
+    if name not in EXPORTS or fmt not in ('csv', 'xlsx'):
+        abort(404)
+
+    # Rows are streamed from storage a chunk at a time while the response is sent
+    table, date_column = EXPORTS[name]
+    date_from = request.args.get('date_from', '')
+    date_to = request.args.get('date_to', '')
+    start, end = parse_date_range(date_from, date_to)
+    chunks = storage.scan(table, 'RetailerID', current_retailer_id(), date_column, start, end)
+    columns = required_files[table]
+
+    days = [start, end - pd.Timedelta(days=1) if end is not None else None]
+    filename = '_'.join([name, *(d.strftime('%Y-%m-%d') for d in days if d is not None)]) + f'.{fmt}'
+    headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
+    if fmt == 'csv':
+        return Response(stream_with_context(stream_csv(chunks, columns)), mimetype='text/csv', headers=headers)
+    return Response(stream_with_context(stream_xlsx(chunks, columns, name)), mimetype=XLSX_MIMETYPE, headers=headers)
+
+@app.route('/download_invoice/<order_id>')
 def download_invoice(order_id):
     if 'email' not in session:
         return redirect(url_for('login'))
     
     try:
-        df = pd.read_excel(ORDERS_FILE)
-        order_items = df[df['OrderID'] == order_id].to_dict('records')
+        # Ids are numbers, or text like "O001" for older orders
+        ids = [order_id, int(order_id)] if order_id.isdigit() else [order_id]
+        order_items = storage.find(ORDERS_FILE, 'OrderID', ids)
+        order_items = order_items[order_items['RetailerID'] == current_retailer_id()]
         
-        if not order_items:
+        if order_items.empty:
             return "Order not found", 404
         
-        total_amount = sum(float(item['Total']) for item in order_items)  # Ensure float
-        order_date = order_items[0]['OrderDate']
-        
-        invoice_data = {
-            'OrderID': order_id,
-            'items': order_items,
-            'total_amount': total_amount,
-            'order_date': order_date
-        }
-        
-        pdf_buffer = generate_pdf_invoice(invoice_data)
-        return send_file(
-            pdf_buffer,
+        # Rendered once per content; later downloads are served from disk
+        path, digest = invoice_cache.get(order_invoices(order_items)[0])
+        response = send_file(
+            path,
             as_attachment=True,
             download_name=f"invoice_{order_id}.pdf",
-            mimetype='application/pdf'
+            mimetype='application/pdf',
+            etag=digest,
+            max_age=0
         )
+        response.cache_control.private = True
+        return response
     except Exception as e:
         print(f"Error generating invoice: {e}")
         return f"Error generating invoice: {str(e)}", 500
 
+@app.route('/invoices')
+def monthly_invoices():
+    if 'email' not in session:
+        return redirect(url_for('login'))
+    
+    month = request.args.get('month', '')
+    fmt = request.args.get('format', 'zip')
+    try:
+        period = pd.Period(month, freq='M')
+    except ValueError:
+        period = None
+    if period is None or pd.isna(period):  # An empty month parses to NaT
+        return "Invalid month, expected YYYY-MM", 400
+    if fmt not in ('zip', 'pdf'):
+        abort(404)
+    
+    try:
+        chunks = list(storage.scan(ORDERS_FILE, 'RetailerID', current_retailer_id(), 'OrderDate',
+                                   period.start_time, (period + 1).start_time))
+        invoices = order_invoices(pd.concat(chunks, ignore_index=True)) if chunks else []
+        if not invoices:
+            return "No orders in that month", 404
+        
+        download_name = f"invoices_{period}.{fmt}"
+        if fmt == 'pdf':
+            return send_file(BytesIO(render_invoices(invoices)), as_attachment=True,
+                             download_name=download_name, mimetype='application/pdf')
+        archive = tempfile.TemporaryFile()
+        invoice_cache.write_zip(invoices, archive)
+        archive.seek(0)
+        return send_file(archive, as_attachment=True, download_name=download_name, mimetype='application/zip')
+    except Exception as e:
+        print(f"Error generating invoices: {e}")
+        return f"Error generating invoices: {str(e)}", 500
+
+def apply_voice_order(text, cart_id):
+    # Adds every product named in a voice command ("add 5 kg rice, 2 l oil
+    # and 10 soap") to the cart in one update; runs on the voice queue
+    items, unparsed = parse_voice_order(text)
+    if not items:
+        return {'success': False, 'error': 'Could not understand command'}
+    
+    products = product_index.resolve([item['name'] for item in items])
+    added = [(item, product) for item, product in zip(items, products) if product is not None]
+    not_found = [item['name'] for item, product in zip(items, products) if product is None]
+    if not added:
+        return {'success': False, 'error': f"No product matches {', '.join(repr(n) for n in not_found)}"}
+    
+    def add_items(cart):
+        for item, product in added:
+            cart.add(product['ProductID'], product['Name'], product['Price'], item['quantity'])
+    
+    # Read, changed and stored in one transaction, as the shopper may be
+    # editing the cart meanwhile; a cart checked out or logged out of since
+    # the order was queued stays gone
+    cart = cart_store.update(cart_id, add_items)
+    if cart is None:
+        return {'success': False, 'error': 'Your cart was checked out or closed before the order was processed'}
+    
+    message = "Added " + ", ".join(f"{item['quantity']}{item['unit']} {product['Name']}" for item, product in added) + " to cart"
+    if not_found or unparsed:
+        message += f"; could not add {', '.join(not_found + unparsed)}"
+    return {
+        'success': True,
+        'message': message,
+        'items': [{'ProductID': product['ProductID'], 'ProductName': product['Name'], 'Quantity': item['quantity'],
+                   'Heard': item['text']} for item, product in added],
+        'not_found': not_found + unparsed,
+        'cart_size': len(cart)
+    }
+
+# Voice orders are recognized and applied in the background (NOMII_RECOGNIZER
+# picks the speech backend: google, or offline for tests)
+voice_jobs = VoiceJobQueue(os.path.join('data', 'voice.db'), make_recognizer(), apply_voice_order,
+                           workers=int(os.environ.get('NOMII_VOICE_THREADS', 2)))
+
 @app.route('/voice_order', methods=['POST'])
 def voice_order():
     if 'email' not in session:
         return jsonify({'success': False, 'error': 'Not logged in'})
     
+    # An uploaded recording, or a transcript the browser already made
+    audio_file = request.files.get('audio')
+    payload = request.get_json(silent=True) or {}
+    text = (request.form.get('text') or payload.get('transcript') or '').strip()
+    if audio_file is None and not text:
+        return jsonify({'success': False, 'error': 'No audio or text received'}), 400
+    
     try:
-        audio_file = request.files['audio']
-        r = sr.Recognizer()
-        
-        with sr.AudioFile(audio_file) as source:
-            audio_data = r.record(source)
-            text = r.recognize_google(audio_data)
-            
-        pattern = r'(?:add|order)\s+(\d+)\s*(kg|g|ml|l)?\s+(.+)'
-        match = re.search(pattern, text, re.IGNORECASE)
-        
-        if not match:
-            return jsonify({'success': False, 'error': 'Could not understand command'})
-        
-        quantity = int(match.group(1))
-        unit = match.group(2) or ''
-        product_name = match.group(3).strip()
-        
-        df = pd.read_excel(PRODUCTS_FILE)
-        product = df[df['Name'].str.contains(product_name, case=False)].iloc[0]
-        
-        cart = session.get('cart', [])
-        
-        found = False
-        for item in cart:
-            if item['ProductID'] == product['ProductID']:
-                item['Quantity'] += quantity
-                item['Total'] = float(item['Quantity'] * float(item['Price']))  # Ensure float
-                found = True
-                break
-        
-        if not found:
-            cart.append({
-                'ProductID': int(product['ProductID']),  # Ensure native int
-                'ProductName': product['Name'],
-                'Quantity': quantity,
-                'Price': float(product['Price']),  # Ensure native float
-                'Total': float(quantity * float(product['Price']))  # Ensure float
-            })
-        
-        session['cart'] = cart
+        # The job only adds to a cart that exists, so store it now
+        save_cart(load_cart())
+        job_id = voice_jobs.submit(session['email'], session['cart_id'],
+                                   audio=audio_file.read() if audio_file is not None else None,
+                                   transcript=None if audio_file is not None else text)
+        # The client polls status_url for the outcome
         return jsonify({
             'success': True,
-            'message': f"Added {quantity}{unit} {product_name} to cart",
-            'cart_size': len(cart)
-        })
+            'job_id': job_id,
+            'status_url': url_for('voice_order_status', job_id=job_id)
+        }), 202
     except Exception as e:
-        print(f"Error processing voice order: {e}")
+        print(f"Error queueing voice order: {e}")
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/voice_order/<job_id>')
+def voice_order_status(job_id):
+    job = voice_jobs.get(job_id, session.get('email'))
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown voice order'}), 404
+    return jsonify(job)
+
 @app.route('/ai_assistant', methods=['GET', 'POST'])
 def ai_assistant():
     if 'email' not in session:
@@ -637,20 +861,20 @@ def ai_assistant():
         response = ""
         
         if 'track' in query and 'order' in query:
-            last_order = sorted(get_user_orders(), key=lambda x: x['OrderDate'], reverse=True)[0]
+            last_order = sorted(get_user_orders(current_retailer_id()), key=lambda x: x['OrderDate'], reverse=True)[0]
             response = f"Your last order #{last_order['OrderID']} is {last_order['Status']}"
         elif 'suggest' in query and ('trend' in query or 'popular' in query):
             suggestions = get_product_suggestions()
             product_names = ", ".join([s['Name'] for s in suggestions[:3]])
             response = f"Popular suggestions: {product_names}"
         elif 'restock' in query or 'low stock' in query:
-            predictions = generate_restock_predictions()
+            predictions = generate_restock_predictions(current_retailer_id())
             if predictions:
                 response = "You might want to restock: " + ", ".join([p['product'] for p in predictions])
             else:
                 response = "Your stock levels look good right now."
         elif 'combo' in query or 'deal' in query:
-            combos = generate_combo_suggestions()
+            combos = generate_combo_suggestions(current_retailer_id())
             if combos:
                 response = "Suggested combos: " + "; ".join([f"{c['products']} ({c['discount']})" for c in combos])
             else:
@@ -668,13 +892,13 @@ def profile():
         return redirect(url_for('login'))
     
     try:
-        df = pd.read_excel(USERS_FILE)
-        user = df[df['Email'] == session['email']].iloc[0].to_dict()
+        user = storage.find(USERS_FILE, 'Email', session['email']).iloc[0].to_dict()
         
-        rewards_df = pd.read_excel(REWARDS_FILE)
+        retailer_id = current_retailer_id()
+        rewards_df = storage.find(REWARDS_FILE, 'RetailerID', retailer_id)
         rewards = rewards_df.iloc[0].to_dict() if not rewards_df.empty else None
         
-        money_df = pd.read_excel(MONEY_SPENT_FILE)
+        money_df = storage.find(MONEY_SPENT_FILE, 'RetailerID', retailer_id)
         total_spent = float(money_df['Amount'].sum()) if not money_df.empty else 0.0
         
         return render_template('profile.html', 
@@ -685,8 +909,106 @@ def profile():
         print(f"Error loading profile data: {e}")
         return render_template('profile.html', error="Could not load profile data")
 
+@app.route('/cache_stats')
+def cache_stats():
+    if 'email' not in session:
+        return jsonify({'success': False, 'error': 'Not logged in'})
+    return jsonify(table_cache.stats())
+
+@app.cli.command('export-xlsx')
+def export_xlsx():
+    # Write the current tables back out to the workbooks under data/
+    storage.compact()
+    print("Workbooks are up to date")
+
+@app.cli.command('init-data')
+@click.option('--check', is_flag=True, help="Only compare the data directory with its manifest")
+def init_data_command(check):
+    # Create missing workbooks and columns, and (re)write data/manifest.json
+    if not check:
+        manifest, changes = init_data(required_files, DATA_SCHEMA_VERSION, MANIFEST_FILE)
+        for change in changes:
+            print(change)
+        rows = sum(entry['rows'] for entry in manifest['tables'].values())
+        print(f"Wrote {MANIFEST_FILE}: {len(manifest['tables'])} workbooks, {rows} rows, "
+              f"schema version {DATA_SCHEMA_VERSION}")
+        return
+
+    manifest = load_manifest(MANIFEST_FILE)
+    problems = check_manifest(manifest, required_files, DATA_SCHEMA_VERSION)
+    if manifest is not None:
+        file_problems, notes = verify_files(manifest, required_files)
+        problems += file_problems
+        for note in notes:
+            print(note)
+    if problems:
+        raise click.ClickException('; '.join(problems))
+    print(f"{MANIFEST_FILE} matches schema version {DATA_SCHEMA_VERSION}")
+
+@app.cli.command('import-orders')
+@click.argument('path')
+@click.option('--skip-invalid', is_flag=True, help="Import the valid lines even if some are invalid")
+def import_orders_command(path, skip_invalid):
+    # Bulk-load order history from a CSV, xlsx or Parquet file
+    started = time.perf_counter()
+    try:
+        df = read_orders_file(path)
+        print(f"Read {len(df)} rows in {time.perf_counter() - started:.2f}s")
+        summary = import_orders(storage, ORDERS_FILE, df, storage.read(PRODUCTS_FILE), order_ids, skip_invalid)
+    except (OSError, ValueError) as e:
+        raise click.ClickException(str(e))
+    errors = summary['errors']
+    for row, error in errors.head(20).itertuples(index=False):
+        print(f"  row {row}: {error}")
+    if len(errors) > 20:
+        print(f"  ... and {len(errors) - 20} more")
+    if not summary['imported']:
+        print(f"Nothing imported ({len(errors)} invalid rows)" + ("" if skip_invalid else "; fix them or pass --skip-invalid"))
+        return
+
+    refresh_order_indexes()
+    total_seconds = time.perf_counter() - started
+    print(f"Imported {summary['imported']} rows as {summary['orders']} orders, skipped {len(errors)}")
+    print(f"Validate {summary['validate_seconds']:.2f}s, write {summary['write_seconds']:.2f}s: "
+          f"{summary['rows_per_second']:,.0f} rows/sec ({len(df) / total_seconds:,.0f} rows/sec including read)")
+
+@app.route('/import_orders', methods=['POST'])
+def import_orders_upload():
+    # A retailer's own order history from another system, as a CSV, xlsx or
+    # Parquet upload ("file"). Every line is imported under the logged-in
+    # retailer; `flask import-orders` loads files spanning many retailers.
+    if 'email' not in session:
+        return jsonify({'success': False, 'error': 'Not logged in'})
+    
+    upload = request.files.get('file')
+    if upload is None or not upload.filename:
+        return jsonify({'success': False, 'error': 'No file uploaded'}), 400
+    skip_invalid = request.form.get('skip_invalid') in ('1', 'true', 'on')
+    try:
+        df = read_orders_file(upload.stream, upload.filename)
+        summary = import_orders(storage, ORDERS_FILE, df, storage.read(PRODUCTS_FILE), order_ids,
+                                skip_invalid, retailer_id=current_retailer_id())
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error importing orders: {e}")
+        return jsonify({'success': False, 'error': 'Import failed'})
+    
+    if summary['imported']:
+        refresh_order_indexes()
+    errors = summary['errors']
+    return jsonify({
+        'success': summary['imported'] > 0 or errors.empty,
+        'imported': summary['imported'],
+        'orders': summary['orders'],
+        'invalid': len(errors),
+        'errors': [{'row': int(row), 'error': error} for row, error in errors.head(100).itertuples(index=False)],
+        'rows_per_second': round(summary.get('rows_per_second', 0))
+    })
+
 @app.route('/logout')
 def logout():
+    clear_cart()
     session.clear()
     return redirect(url_for('login'))
 
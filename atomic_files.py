@@ -0,0 +1,56 @@
+# Writing files other processes may be reading at the same time. Every writer
+# goes through here so there is one copy of the temp-file-and-rename dance.
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+
+@contextmanager
+def atomic_write(path, suffix='.tmp'):
+    # Yields a temp path next to path; whatever is written there replaces
+    # path in one rename, so readers never see half a file. Each writer gets
+    # a temp file of its own, so processes saving the same file do not collide.
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix=suffix)
+    os.close(fd)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def write_json(data, path, **kwargs):
+    with atomic_write(path) as tmp_path:
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, **kwargs)
+
+
+def write_bytes(data, path):
+    with atomic_write(path) as tmp_path:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+
+
+class FileLock:
+    # Cross-process exclusive lock on path. Not re-entrant: a second FileLock
+    # on the same path in the same process blocks on the first.
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+
+    def __enter__(self):
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        os.close(self.fd)  # Closing the descriptor releases the lock
+        self.fd = None
@@ -0,0 +1,84 @@
+import argparse
+import os
+import tempfile
+import time
+
+from flask import Flask, jsonify, request, session
+
+from cart import Cart, CartStore
+
+# Compares request latency for carts kept in the signed cookie session with
+# carts kept in cart.CartStore (only the cart id in the cookie). Each mode
+# fills a cart to the given size, then times adding to it and viewing it.
+#
+#   python bench_cart.py
+#   python bench_cart.py --sizes 10 100 500 --requests 200
+
+
+def make_app(store):
+    app = Flask(__name__)
+    app.secret_key = 'bench'
+
+    def load_cart():
+        if store is None:
+            return Cart.load(session.get('cart'))
+        return store.get(session['cart_id']) if 'cart_id' in session else Cart()
+
+    def save_cart(cart):
+        if store is None:
+            session['cart'] = cart.dump()
+            return
+        if 'cart_id' not in session:
+            session['cart_id'] = store.new_id()
+        store.put(session['cart_id'], cart)
+
+    @app.route('/add', methods=['POST'])
+    def add():
+        cart = load_cart()
+        product_id = request.form['product_id']
+        cart.add(product_id, f"Product {product_id}", 12.5, int(request.form.get('quantity', 1)))
+        save_cart(cart)
+        return jsonify({'cart_size': len(cart)})
+
+    @app.route('/cart')
+    def view():
+        cart = load_cart()
+        return jsonify({'lines': cart.lines(), 'total': cart.total})
+
+    return app
+
+
+def run(store, size, requests):
+    client = make_app(store).test_client()
+    for i in range(size):
+        client.post('/add', data={'product_id': f"P{i:05}"})
+    cookie = client.get_cookie('session')
+    cookie_bytes = len(cookie.value) if cookie else 0
+
+    timings = {}
+    for name, call in (('add', lambda i: client.post('/add', data={'product_id': f"P{i % size:05}"})),
+                       ('view', lambda i: client.get('/cart'))):
+        start = time.perf_counter()
+        for i in range(requests):
+            call(i)
+        timings[name] = (time.perf_counter() - start) / requests * 1000
+    return timings, cookie_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cookie vs server-side carts")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 500])
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = CartStore(os.path.join(tmp, 'carts.db'))
+        print(f"{'lines':>6} {'mode':>7} {'add ms':>8} {'view ms':>8} {'cookie bytes':>13}")
+        for size in args.sizes:
+            for mode, mode_store in (('cookie', None), ('server', store)):
+                timings, cookie_bytes = run(mode_store, size, args.requests)
+                print(f"{size:>6} {mode:>7} {timings['add']:>8.3f} {timings['view']:>8.3f} {cookie_bytes:>13}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+import argparse
+import time
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from insights import count_pairs
+
+# Compares the original nested-loop combo counting with the vectorised
+# rebuild in insights.count_pairs on synthetic order histories.
+#
+#   python bench_combo_pairs.py
+#   python bench_combo_pairs.py --sizes 10000 100000 --legacy-max 100000
+
+
+def synthetic_orders(n_lines, n_products=500, lines_per_order=4, seed=0):
+    rng = np.random.default_rng(seed)
+    n_orders = max(1, n_lines // lines_per_order)
+    return pd.DataFrame({
+        'OrderID': np.sort(rng.integers(1, n_orders + 1, n_lines)),
+        'ProductName': [f"Product {i:05}" for i in rng.integers(0, n_products, n_lines)]
+    })
+
+
+def legacy_pairs(orders_df):
+    # The loop generate_combo_suggestions used to run on every dashboard load
+    order_ids = orders_df['OrderID'].unique()
+    product_pairs = defaultdict(int)
+
+    for order_id in order_ids:
+        products = orders_df[orders_df['OrderID'] == order_id]['ProductName'].tolist()
+        for i in range(len(products)):
+            for j in range(i+1, len(products)):
+                pair = tuple(sorted([products[i], products[j]]))
+                product_pairs[pair] += 1
+    return product_pairs
+
+
+def vectorized_pairs(orders_df):
+    products, counts = count_pairs(orders_df['OrderID'], orders_df['ProductName'])
+    return {(products[a], products[b]): count for (a, b), count in counts.items()}
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark combo pair counting")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--legacy-max', type=int, default=100_000,
+                        help="skip the nested loop above this many lines (it is O(orders x rows))")
+    args = parser.parse_args()
+
+    print(f"{'lines':>10} {'legacy s':>10} {'vectorized s':>13} {'speedup':>9}  match")
+    for size in args.sizes:
+        orders_df = synthetic_orders(size)
+        fast, fast_time = timed(vectorized_pairs, orders_df)
+        if size <= args.legacy_max:
+            slow, slow_time = timed(legacy_pairs, orders_df)
+            match = 'yes' if dict(slow) == fast else 'NO'
+            print(f"{size:>10} {slow_time:>10.3f} {fast_time:>13.3f} {slow_time / fast_time:>8.1f}x  {match}")
+        else:
+            print(f"{size:>10} {'skipped':>10} {fast_time:>13.3f} {'-':>9}  -")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import pandas as pd
+
+from data_files import required_files
+from table_cache import TableCache, load_workbook, sidecar_path
+
+# Cold vs warm load times for the workbooks in data_files.required_files.
+# Cold is what the first process pays: parsing the xlsx with openpyxl and
+# writing the sidecar. Warm is what every later process pays: reading the
+# sidecar. Each workbook is copied to a scratch directory first (optionally
+# grown to --rows rows), so data/ is left as it is.
+#
+#   python bench_sidecar.py
+#   python bench_sidecar.py --rows 20000
+
+
+def grown(df, rows):
+    if df.empty or len(df) >= rows:
+        return df
+    return pd.concat([df] * (rows // len(df) + 1), ignore_index=True).head(rows)
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark xlsx parsing vs Feather sidecars")
+    parser.add_argument('--rows', type=int, default=0, help="grow each table to this many rows")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'table':<28} {'rows':>7} {'xlsx ms':>9} {'cold ms':>9} {'warm ms':>9} {'speedup':>8} {'sidecar KB':>11}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for source in required_files:
+            path = os.path.join(tmp, os.path.basename(source))
+            if args.rows:
+                grown(load_workbook(source), args.rows).to_excel(path, index=False)
+            else:
+                shutil.copy(source, path)
+            stamp = TableCache._stamp(path)
+
+            def cold():
+                if os.path.exists(sidecar_path(path, stamp)):
+                    os.remove(sidecar_path(path, stamp))
+                TableCache().get(path)
+
+            parse_ms = timed(lambda: load_workbook(path), args.repeat)
+            cold_ms = timed(cold, args.repeat)
+            # A fresh cache stands in for another worker process
+            warm_ms = timed(lambda: TableCache().get(path), args.repeat)
+            rows = len(TableCache().get(path))
+            size = os.path.getsize(sidecar_path(path, stamp)) / 1024
+            print(f"{os.path.basename(source):<28} {rows:>7} {parse_ms:>9.1f} {cold_ms:>9.1f} {warm_ms:>9.1f} "
+                  f"{parse_ms / warm_ms:>7.0f}x {size:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
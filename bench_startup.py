@@ -0,0 +1,71 @@
+import argparse
+import glob
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Startup cost of one worker: the time to import app and the process RSS
+# afterwards, each measured in a fresh interpreter. "eager" first imports
+# the modules app.py used to import at the top, for comparison with the
+# lazy imports it does now. Importing app writes its manifest and databases
+# next to the workbooks, so the workers run in a scratch directory holding a
+# copy of data/'s workbooks, and data/ is left as it is.
+#
+#   python bench_startup.py
+#   python bench_startup.py --runs 10 --workers 8
+
+HEAVY_MODULES = ['speech_recognition', 'matplotlib.pyplot', 'fpdf', 'openpyxl']
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+CHILD = """
+import importlib, json, resource, sys, time
+sys.path.insert(0, sys.argv[1])
+start = time.perf_counter()
+for name in sys.argv[2:]:
+    importlib.import_module(name)
+import app
+elapsed = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({
+    'seconds': elapsed,
+    'rss_mb': rss / 1024 / (1024 if sys.platform == 'darwin' else 1),
+    'loaded': [m for m in %r if m in sys.modules]
+}))
+""" % (HEAVY_MODULES,)
+
+
+def measure(preload, cwd):
+    out = subprocess.run([sys.executable, '-c', CHILD, ROOT, *preload], capture_output=True, text=True,
+                         check=True, cwd=cwd)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark worker import time and RSS")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=4, help="report the baseline RSS for this many workers")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.mkdir(os.path.join(tmp, 'data'))
+        for path in glob.glob(os.path.join(ROOT, 'data', '*.xlsx')):
+            shutil.copy(path, os.path.join(tmp, 'data'))
+
+        # Any first-run setup (e.g. loading workbooks into SQLite) happens here
+        measure([], tmp)
+
+        print(f"{'mode':<6} {'import s':>9} {'RSS MB':>8} {f'x{args.workers} MB':>9}  heavy modules loaded")
+        for mode, preload in (('lazy', []), ('eager', HEAVY_MODULES)):
+            runs = [measure(preload, tmp) for _ in range(args.runs)]
+            seconds = statistics.median(r['seconds'] for r in runs)
+            rss = statistics.median(r['rss_mb'] for r in runs)
+            print(f"{mode:<6} {seconds:>9.3f} {rss:>8.1f} {rss * args.workers:>9.0f}  {', '.join(runs[0]['loaded']) or '-'}")
+
+
+if __name__ == '__main__':
+    main()
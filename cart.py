@@ -0,0 +1,261 @@
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+# A shopping cart keyed by ProductID. Lines are added, changed and removed
+# in O(1), and the cart total is adjusted as lines change so it never has
+# to be re-summed. A cart is stored compactly as
+# {'items': {product_id: [name, quantity, price]}, 'total': total}.
+class Cart:
+    def __init__(self, items=None, total=None):
+        self.items = items if items is not None else {}
+        # Product ids changed since the cart was last stored
+        self.dirty = set()
+        if total is None:
+            total = sum(self.line_total(pid) for pid in self.items)
+        self.total = round(float(total), 2)
+
+    @classmethod
+    def load(cls, data):
+        if not data:
+            return cls()
+        if isinstance(data, list):
+            # Carts saved as a list of line dicts, before carts were keyed
+            cart = cls()
+            for item in data:
+                if int(item['Quantity']) <= 0:
+                    continue
+                cart.add(item.get('ProductID', item['ProductName']), item['ProductName'],
+                         item['Price'], item['Quantity'])
+            return cart
+        return cls({pid: list(line) for pid, line in data['items'].items()}, data.get('total'))
+
+    def dump(self):
+        return {'items': self.items, 'total': self.total}
+
+    def copy(self):
+        return Cart({pid: list(line) for pid, line in self.items.items()}, self.total)
+
+    def line_total(self, product_id):
+        _, quantity, price = self.items[product_id]
+        return round(quantity * price, 2)
+
+    def add(self, product_id, name, price, quantity):
+        # Adds quantity to the product's line, creating it if needed.
+        # Lines are reduced or removed with set_quantity, never here.
+        quantity = int(quantity)
+        if quantity <= 0:
+            raise ValueError("quantity must be at least 1")
+        if product_id in self.items:
+            return self.set_quantity(product_id, self.items[product_id][1] + quantity)
+        self.items[product_id] = [name, quantity, round(float(price), 2)]
+        self.dirty.add(product_id)
+        self.total = round(self.total + self.line_total(product_id), 2)
+        return True
+
+    def set_quantity(self, product_id, quantity):
+        # Returns False if the product is not in the cart; quantity <= 0 removes it
+        if product_id not in self.items:
+            return False
+        if quantity <= 0:
+            return self.remove(product_id)
+        old_total = self.line_total(product_id)
+        self.items[product_id][1] = int(quantity)
+        self.dirty.add(product_id)
+        self.total = round(self.total - old_total + self.line_total(product_id), 2)
+        return True
+
+    def remove(self, product_id):
+        if product_id not in self.items:
+            return False
+        self.total = round(self.total - self.line_total(product_id), 2)
+        del self.items[product_id]
+        self.dirty.add(product_id)
+        if not self.items:
+            self.total = 0.0  # Drop any rounding residue
+        return True
+
+    def line(self, product_id):
+        name, quantity, price = self.items[product_id]
+        return {
+            'ProductID': product_id,
+            'ProductName': name,
+            'Quantity': quantity,
+            'Price': price,
+            'Total': self.line_total(product_id)
+        }
+
+    def lines(self):
+        return [self.line(pid) for pid in self.items]
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, product_id):
+        return product_id in self.items
+
+
+# Carts kept server side so the session cookie only carries an opaque cart
+# id. Lines are rows in SQLite, and storing a cart writes only the lines it
+# changed. Recently used carts stay parsed in an in-process LRU; each entry
+# is checked against the cart's version, so another worker's writes are
+# never missed.
+class CartStore:
+    def __init__(self, path, capacity=1024, max_age_days=30):
+        self.path = path
+        self.capacity = capacity
+        self.max_age = max_age_days * 86400
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        conn = self._connect()
+        with conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS carts '
+                         '(id TEXT PRIMARY KEY, total REAL, version INTEGER, updated REAL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS cart_lines (cart_id TEXT, product_id TEXT, name TEXT, '
+                         'quantity INTEGER, price REAL, PRIMARY KEY (cart_id, product_id))')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_carts_updated ON carts (updated)')
+
+    def _connect(self):
+        # One connection per thread and process: a worker forked after
+        # import must not reuse the handle its parent opened
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def new_id(self):
+        self.prune()
+        return secrets.token_urlsafe(16)
+
+    def get(self, cart_id):
+        # A copy of the stored cart, or an empty cart for unknown ids
+        conn = self._connect()
+        with conn:
+            # One read transaction, so the lines belong to the version read
+            conn.execute('BEGIN')
+            loaded = self._load(conn, cart_id)
+        return loaded[1] if loaded is not None else Cart()
+
+    def _load(self, conn, cart_id):
+        # (version, copy of the stored cart), or None for unknown ids
+        row = conn.execute('SELECT version, total FROM carts WHERE id = ?', (cart_id,)).fetchone()
+        if row is None:
+            return None
+        version, total = row
+        with self._lock:
+            cached = self._cache.get(cart_id)
+            if cached is not None and cached[0] == version:
+                self._cache.move_to_end(cart_id)
+                return version, cached[1].copy()
+
+        lines = conn.execute('SELECT product_id, name, quantity, price FROM cart_lines '
+                             'WHERE cart_id = ? ORDER BY rowid', (cart_id,))
+        cart = Cart({pid: [name, quantity, price] for pid, name, quantity, price in lines}, total)
+        self._remember(cart_id, version, cart)
+        return version, cart.copy()
+
+    def put(self, cart_id, cart):
+        # Writes the lines cart changed and moves the stored total by the
+        # difference they make, in one transaction, so writers interleaving
+        # on one cart cannot store a total its lines disagree with
+        conn = self._connect()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT version FROM carts WHERE id = ?', (cart_id,)).fetchone()
+            version, total = self._write(conn, cart_id, cart)
+
+        # The cached cart is brought forward if it is the version this write
+        # started from; otherwise the next get reads the cart again
+        with self._lock:
+            cached = self._cache.pop(cart_id, None)
+        if row is None:
+            stored = Cart()
+        elif cached is not None and cached[0] == row[0]:
+            stored = cached[1]
+        else:
+            stored = None
+        if stored is not None:
+            for pid in cart.dirty:
+                if pid in cart.items:
+                    stored.items[pid] = list(cart.items[pid])
+                else:
+                    stored.items.pop(pid, None)
+            stored.total = total
+            self._remember(cart_id, version, stored)
+        cart.total = total
+        cart.dirty.clear()
+
+    def update(self, cart_id, change):
+        # Reads the stored cart, applies change(cart) and stores it, all in
+        # one transaction, for writers that do not hold the cart themselves
+        # (voice orders). Returns the updated cart, or None if the cart no
+        # longer exists (checked out or logged out); it is not recreated.
+        conn = self._connect()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            loaded = self._load(conn, cart_id)
+            if loaded is None:
+                return None
+            cart = loaded[1]
+            change(cart)
+            version, cart.total = self._write(conn, cart_id, cart)
+        cart.dirty.clear()
+        self._remember(cart_id, version, cart)
+        return cart.copy()
+
+    def _write(self, conn, cart_id, cart):
+        # Stores cart's dirty lines and adds the change in their line totals
+        # to the cart's total; the caller holds the transaction. Returns the
+        # new (version, total).
+        delta = 0.0
+        for pid in cart.dirty:
+            old = conn.execute('SELECT quantity, price FROM cart_lines WHERE cart_id = ? AND product_id = ?',
+                               (cart_id, pid)).fetchone()
+            if old is not None:
+                delta -= round(old[0] * old[1], 2)
+            if pid in cart.items:
+                name, quantity, price = cart.items[pid]
+                delta += cart.line_total(pid)
+                # An upsert keeps the line's rowid, and with it its place in the cart
+                conn.execute('INSERT INTO cart_lines VALUES (?, ?, ?, ?, ?) '
+                             'ON CONFLICT (cart_id, product_id) DO UPDATE SET '
+                             'name = excluded.name, quantity = excluded.quantity, price = excluded.price',
+                             (cart_id, pid, name, quantity, price))
+            elif old is not None:
+                conn.execute('DELETE FROM cart_lines WHERE cart_id = ? AND product_id = ?', (cart_id, pid))
+        conn.execute('INSERT INTO carts VALUES (?, ?, 1, ?) ON CONFLICT (id) DO UPDATE SET '
+                     'total = ROUND(total + excluded.total, 2), version = version + 1, updated = excluded.updated',
+                     (cart_id, round(delta, 2), time.time()))
+        return conn.execute('SELECT version, total FROM carts WHERE id = ?', (cart_id,)).fetchone()
+
+    def delete(self, cart_id):
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM cart_lines WHERE cart_id = ?', (cart_id,))
+            conn.execute('DELETE FROM carts WHERE id = ?', (cart_id,))
+        with self._lock:
+            self._cache.pop(cart_id, None)
+
+    def prune(self):
+        # Drops carts nobody has touched for max_age
+        conn = self._connect()
+        cutoff = time.time() - self.max_age
+        with conn:
+            conn.execute('DELETE FROM cart_lines WHERE cart_id IN (SELECT id FROM carts WHERE updated < ?)',
+                         (cutoff,))
+            conn.execute('DELETE FROM carts WHERE updated < ?', (cutoff,))
+
+    def _remember(self, cart_id, version, cart):
+        with self._lock:
+            self._cache[cart_id] = (version, cart)
+            self._cache.move_to_end(cart_id)
+            while len(self._cache) > self.capacity:
+                self._cache.popitem(last=False)
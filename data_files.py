@@ -0,0 +1,21 @@
+# The workbooks the app keeps its data in and the columns each must have.
+# Kept apart from app.py so tools can read the layout without starting the
+# app (which opens the databases and creates missing files).
+
+PRODUCTS_FILE = 'data/Products.xlsx'
+ORDERS_FILE = 'data/retailer_orders.xlsx'
+AI_SUGGESTIONS_FILE = 'data/Ai_suggestion_products.xlsx'
+DELIVERY_STATUS_FILE = 'data/deliverystatus.xlsx'
+MONEY_SPENT_FILE = 'data/MoneySpent.xlsx'
+REWARDS_FILE = 'data/retailer_rewards.xlsx'
+USERS_FILE = 'data/retailer_users.xlsx'
+
+required_files = {
+    PRODUCTS_FILE: ['ProductID', 'Name', 'Category', 'Price', 'Supplier', 'Stock'],
+    ORDERS_FILE: ['OrderID', 'RetailerID', 'ProductID', 'ProductName', 'Quantity', 'Price', 'Total', 'OrderDate', 'Status'],
+    AI_SUGGESTIONS_FILE: ['ProductID', 'Name', 'Category', 'Reason'],
+    DELIVERY_STATUS_FILE: ['OrderID', 'Status', 'LastUpdate', 'DeliveryAgent'],
+    MONEY_SPENT_FILE: ['TransactionID', 'RetailerID', 'Amount', 'Date', 'Description'],
+    REWARDS_FILE: ['RetailerID', 'Points', 'Badges', 'Level'],
+    USERS_FILE: ['RetailerID', 'ShopName', 'OwnerName', 'Location', 'Phone', 'Email', 'Password']
+}
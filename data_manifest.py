@@ -0,0 +1,122 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+
+import pandas as pd
+
+from atomic_files import FileLock, write_json
+from storage import write_workbook
+from table_cache import read_table
+
+# The data directory is described by a manifest: the schema version it was
+# initialised for and, per workbook, its columns, row count and checksum.
+# Workers compare the manifest with the schema they were built for (one
+# small JSON read) instead of probing every workbook at import time;
+# `flask init-data` creates the workbooks and writes the manifest.
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def describe_workbook(path):
+    df = read_table(path)
+    return {
+        'columns': [str(c) for c in df.columns],
+        'rows': len(df),
+        'size': os.path.getsize(path),
+        'sha256': file_digest(path)
+    }
+
+
+def load_manifest(path):
+    # The manifest at path, or None if the data directory has none yet
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def init_data(schema, schema_version, path, if_missing=False):
+    # Creates missing workbooks, adds schema columns missing from existing
+    # ones and writes a fresh manifest to path. Returns (manifest, changes).
+    # Runs under a file lock; with if_missing, a manifest written meanwhile
+    # (by another worker starting up) is returned as it is.
+    data_dir = os.path.dirname(path)
+    if data_dir:
+        os.makedirs(data_dir, exist_ok=True)
+
+    with FileLock(f"{path}.lock"):
+        manifest = load_manifest(path) if if_missing else None
+        if manifest is not None:
+            return manifest, []
+        return _init_data(schema, schema_version, path)
+
+
+def _init_data(schema, schema_version, path):
+    changes = []
+    tables = {}
+    for table, columns in schema.items():
+        if not os.path.exists(table):
+            write_workbook(pd.DataFrame(columns=columns), table)
+            changes.append(f"Created {table}")
+        else:
+            df = read_table(table)
+            missing = [c for c in columns if c not in df.columns]
+            if missing:
+                write_workbook(df.reindex(columns=[*df.columns, *missing]), table)
+                changes.append(f"Added {', '.join(missing)} to {table}")
+        tables[table] = describe_workbook(table)
+
+    manifest = {
+        'schema_version': schema_version,
+        'initialised': datetime.now().isoformat(timespec='seconds'),
+        'tables': tables
+    }
+    write_json(manifest, path, indent=2)
+    return manifest, changes
+
+
+def check_manifest(manifest, schema, schema_version):
+    # Problems that stop this code from using the data directory as it is
+    # described by manifest. Only the manifest is read, not the workbooks.
+    if manifest is None:
+        return ["The data directory has no manifest"]
+    problems = []
+    if manifest.get('schema_version') != schema_version:
+        problems.append(f"Data is at schema version {manifest.get('schema_version')}, "
+                        f"this code expects {schema_version}")
+    tables = manifest.get('tables', {})
+    for table, columns in schema.items():
+        if table not in tables:
+            problems.append(f"{table} is not in the manifest")
+            continue
+        missing = [c for c in columns if c not in tables[table]['columns']]
+        if missing:
+            problems.append(f"{table} lacks column(s) {', '.join(missing)}")
+    return problems
+
+
+def verify_files(manifest, schema):
+    # Compares the workbooks themselves with manifest. Returns (problems,
+    # notes): problems are missing workbooks or columns, notes list the
+    # workbooks that changed since the manifest was written.
+    problems, notes = [], []
+    for table, entry in manifest.get('tables', {}).items():
+        if not os.path.exists(table):
+            problems.append(f"{table} is missing")
+            continue
+        if os.path.getsize(table) == entry['size'] and file_digest(table) == entry['sha256']:
+            continue
+        current = describe_workbook(table)
+        missing = [c for c in schema.get(table, []) if c not in current['columns']]
+        if missing:
+            problems.append(f"{table} lacks column(s) {', '.join(missing)}")
+        notes.append(f"{table} changed since the manifest was written ({entry['rows']} -> {current['rows']} rows)")
+    return problems, notes
@@ -0,0 +1,58 @@
+import csv
+import io
+import os
+import tempfile
+
+import pandas as pd
+
+# Generators that turn storage.scan() chunks into a download as they go,
+# so memory stays at one chunk however long the history is.
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+FILE_CHUNK_SIZE = 64 * 1024
+# Fixed so every chunk formats dates the same way
+CSV_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _records(chunk, columns):
+    # Rows of chunk as tuples in columns order, with missing values as None
+    chunk = chunk.reindex(columns=columns).astype(object)
+    return chunk.where(chunk.notna(), None).itertuples(index=False, name=None)
+
+
+def stream_csv(chunks, columns):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(columns)
+    for chunk in chunks:
+        chunk.reindex(columns=columns).to_csv(buffer, header=False, index=False, date_format=CSV_DATE_FORMAT)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def stream_xlsx(chunks, columns, title='Sheet1'):
+    # openpyxl's write-only mode streams rows into a temporary file; the
+    # finished workbook is then sent from disk in FILE_CHUNK_SIZE pieces
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title)
+    sheet.append(columns)
+    for chunk in chunks:
+        for row in _records(chunk, columns):
+            sheet.append([value.to_pydatetime() if isinstance(value, pd.Timestamp) else value for value in row])
+
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        workbook.save(path)
+        with open(path, 'rb') as f:
+            while True:
+                data = f.read(FILE_CHUNK_SIZE)
+                if not data:
+                    break
+                yield data
+    finally:
+        os.remove(path)
@@ -0,0 +1,35 @@
+import os
+import threading
+
+
+# Hands out ids for one table column from blocks reserved in storage.
+# With block_size > 1 a worker only touches the sequence once per block;
+# ids left over when a worker exits are simply never used.
+class IdAllocator:
+    def __init__(self, storage, table, column, block_size=1):
+        self.storage = storage
+        self.table = table
+        self.column = column
+        self.block_size = max(1, int(block_size))
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+        self._pid = os.getpid()
+
+    def next(self):
+        with self._lock:
+            # A forked worker must not reuse the block its parent reserved
+            if os.getpid() != self._pid:
+                self._pid = os.getpid()
+                self._next = self._end = 0
+            if self._next >= self._end:
+                self._next = self.storage.reserve_ids(self.table, self.column, self.block_size)
+                self._end = self._next + self.block_size
+            value = self._next
+            self._next += 1
+            return value
+
+    def reserve(self, count):
+        # A contiguous run of count ids, taken straight from storage
+        first = self.storage.reserve_ids(self.table, self.column, count)
+        return list(range(first, first + count))
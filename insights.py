@@ -0,0 +1,443 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from atomic_files import write_json
+
+# Above this many products a dense bincount over every possible pair would
+# need too much memory, so pair keys are counted with np.unique instead
+BINCOUNT_MAX_KEYS = 1 << 24
+
+
+def _native(value):
+    # numpy scalars -> plain Python values, so state can be saved as JSON
+    return value.item() if hasattr(value, 'item') else value
+
+
+# Base for structures kept up to date from the append-only orders table.
+# Each index remembers the storage position it has consumed; refresh()
+# reads only rows written after it (by this worker or any other) and folds
+# them in. The state is saved to data/ now and then so a new worker starts
+# warm instead of replaying the whole history.
+#
+# State is partitioned by RetailerID: every retailer gets its own
+# Partition object, and queries only ever touch that retailer's partition.
+class OrderIndex:
+    NAME = None
+    STATE_VERSION = 2
+    PARTITION_COLUMN = 'RetailerID'
+    Partition = None
+
+    def __init__(self, storage, table, path=None, save_interval=30):
+        self.storage = storage
+        self.table = table
+        self.path = path or os.path.join(storage.data_dir, f"{self.NAME}.json")
+        self.save_interval = save_interval
+        self.position = 0
+        self.rows = 0
+        self.partitions = {}
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._dirty = False
+        self._last_save = 0.0
+
+    @staticmethod
+    def partition_key(value):
+        # Rows without a retailer share the '' partition
+        return '' if value is None or pd.isna(value) else str(value)
+
+    def _split(self, frame):
+        if self.PARTITION_COLUMN not in frame.columns:
+            return [('', frame)]
+        keys = frame[self.PARTITION_COLUMN].map(self.partition_key)
+        return frame.groupby(keys, sort=False)
+
+    def _partition(self, key):
+        partition = self.partitions.get(key)
+        if partition is None:
+            partition = self.partitions[key] = self.Partition()
+        return partition
+
+    def apply(self, frame):
+        for key, rows in self._split(frame):
+            self._partition(key).apply(rows)
+
+    def rebuild(self, frame):
+        # Cold start from the full history; partitions may do this faster
+        for key, rows in self._split(frame):
+            self._partition(key).rebuild(rows)
+
+    def query(self, retailer_id, fn):
+        # Run fn against one retailer's partition, after catching up
+        self.refresh()
+        with self._lock:
+            partition = self.partitions.get(self.partition_key(retailer_id))
+            return fn(partition if partition is not None else self.Partition())
+
+    def refresh(self):
+        with self._lock:
+            if not self._loaded:
+                self._load()
+                self._loaded = True
+
+            # Cheap check first: most refreshes find nothing new
+            if self.storage.last_position(self.table) == self.position:
+                return
+            frame, position = self.storage.read_since(self.table, self.position)
+            if not frame.empty:
+                if self.rows == 0:
+                    self.rebuild(frame)
+                else:
+                    self.apply(frame)
+                self.rows += len(frame)
+                self._dirty = True
+            self.position = position
+
+            if self._dirty and time.time() - self._last_save >= self.save_interval:
+                self.save()
+
+    def save(self):
+        with self._lock:
+            write_json({
+                'version': self.STATE_VERSION,
+                'backend': type(self.storage).__name__,
+                'position': self.position,
+                'rows': self.rows,
+                'partitions': {key: p.dump_state() for key, p in self.partitions.items()}
+            }, self.path)
+            self._dirty = False
+            self._last_save = time.time()
+
+    def _load(self):
+        self.partitions = {}
+        self.position = self.rows = 0
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        # A state file from another backend, or from a table that has since
+        # lost rows, cannot be resumed; start over from the full history.
+        if (state.get('version') != self.STATE_VERSION
+                or state.get('backend') != type(self.storage).__name__
+                or state['rows'] > self.storage.count(self.table)):
+            return
+        for key, data in state['partitions'].items():
+            self._partition(key).load_state(data)
+        self.position = state['position']
+        self.rows = state['rows']
+
+
+# The size largest of a set of counts that only ever grow. A key can only
+# enter the set by its own increment, and only by overtaking the current
+# minimum, so keeping it exact costs O(size) per update.
+class TopCounter:
+    def __init__(self, size):
+        self.size = size
+        self.counts = {}
+
+    def update(self, key, total):
+        if key in self.counts or len(self.counts) < self.size:
+            self.counts[key] = total
+            return
+        weakest = min(self.counts, key=self.counts.get)
+        if total > self.counts[weakest]:
+            del self.counts[weakest]
+            self.counts[key] = total
+
+    def rebuild(self, counts):
+        ranked = sorted(counts.items(), key=lambda x: x[1], reverse=True)
+        self.counts = dict(ranked[:self.size])
+
+    def top(self, k):
+        return sorted(self.counts.items(), key=lambda x: x[1], reverse=True)[:k]
+
+
+# Sparse product co-purchase counts: (code_a, code_b) -> number of times the
+# two order lines appeared in the same order. The top pairs are maintained
+# as counts change, so answering top_pairs() never scans the whole matrix.
+class CoPurchaseCounts:
+    TOP_SIZE = 20
+    RECENT_ORDERS = 1000
+
+    def __init__(self):
+        self.products = []
+        self.codes = {}
+        self.pair_counts = {}
+        self._top = TopCounter(self.TOP_SIZE)
+        # Lines of recently seen orders, in case an order's lines are split
+        # across writes (the excel backend appends them one by one)
+        self._recent = OrderedDict()
+
+    def _code(self, name):
+        name = str(name)
+        code = self.codes.get(name)
+        if code is None:
+            code = self.codes[name] = len(self.products)
+            self.products.append(name)
+        return code
+
+    def _pair(self, a, b):
+        # Pairs are keyed in product-name order, as the dashboard shows them
+        return (a, b) if self.products[a] <= self.products[b] else (b, a)
+
+    def _bump(self, pair, count=1):
+        total = self.pair_counts.get(pair, 0) + count
+        self.pair_counts[pair] = total
+        self._top.update(pair, total)
+
+    def apply(self, frame):
+        frame = frame.dropna(subset=['OrderID', 'ProductName'])
+        for order_id, names in frame.groupby('OrderID', sort=False)['ProductName']:
+            order_id = _native(order_id)
+            seen = self._recent.pop(order_id, [])
+            for name in names:
+                code = self._code(name)
+                for other in seen:
+                    self._bump(self._pair(other, code))
+                seen.append(code)
+            self._recent[order_id] = seen
+            if len(self._recent) > self.RECENT_ORDERS:
+                self._recent.popitem(last=False)
+
+    def rebuild(self, frame):
+        frame = frame.dropna(subset=['OrderID', 'ProductName'])
+        products, counts = count_pairs(frame['OrderID'], frame['ProductName'])
+        self.products = products
+        self.codes = {name: code for code, name in enumerate(products)}
+        self.pair_counts = counts
+        self._top.rebuild(counts)
+
+        # Seed the recent-orders window from the tail of the history
+        order_codes, order_ids = pd.factorize(frame['OrderID'])
+        tail = order_codes >= len(order_ids) - self.RECENT_ORDERS
+        names = frame['ProductName'].astype(str).to_numpy()[tail]
+        self._recent = OrderedDict()
+        for code, name in zip(order_codes[tail], names):
+            order_id = order_ids[code]
+            order_id = _native(order_id)
+            self._recent.setdefault(order_id, []).append(self.codes[name])
+
+    def top_pairs(self, k=3):
+        return [((self.products[a], self.products[b]), count) for (a, b), count in self._top.top(k)]
+
+    def dump_state(self):
+        return {
+            'products': self.products,
+            'pairs': [[a, b, count] for (a, b), count in self.pair_counts.items()],
+            'recent': [[order_id, codes] for order_id, codes in self._recent.items()]
+        }
+
+    def load_state(self, data):
+        self.products = data['products']
+        self.codes = {name: code for code, name in enumerate(self.products)}
+        self.pair_counts = {(a, b): count for a, b, count in data['pairs']}
+        self._recent = OrderedDict((order_id, codes) for order_id, codes in data['recent'])
+        self._top.rebuild(self.pair_counts)
+
+
+# Per-product ordering history: order lines, distinct orders, and first and
+# last order dates. Restock predictions read it instead of sorting and
+# filtering the orders table for every product.
+class RestockStats:
+    TOP_SIZE = 20
+
+    def __init__(self):
+        self.products = {}
+        self._top = TopCounter(self.TOP_SIZE)
+
+    def apply(self, frame):
+        frame = frame.dropna(subset=['ProductName'])
+        grouped = frame.groupby(frame['ProductName'].astype(str)).agg(
+            lines=('ProductName', 'size'),
+            orders=('OrderID', 'nunique'),
+            first=('OrderDate', 'min'),
+            last=('OrderDate', 'max'))
+
+        for name, lines, orders, first, last in grouped.itertuples():
+            stats = self.products.setdefault(name, {'lines': 0, 'orders': 0, 'first': None, 'last': None})
+            stats['lines'] += int(lines)
+            stats['orders'] += int(orders)
+            if not pd.isna(first) and (stats['first'] is None or first < stats['first']):
+                stats['first'] = first.to_pydatetime()
+            if not pd.isna(last) and (stats['last'] is None or last > stats['last']):
+                stats['last'] = last.to_pydatetime()
+            self._top.update(name, stats['lines'])
+
+    def rebuild(self, frame):
+        self.apply(frame)
+
+    @staticmethod
+    def interval_days(stats):
+        # Mean gap between orders of the product, or None with fewer than two
+        if stats['orders'] < 2 or stats['first'] is None:
+            return None
+        return (stats['last'] - stats['first']).total_seconds() / 86400 / (stats['orders'] - 1)
+
+    def most_ordered(self, k=5):
+        # [(product name, stats)] for the k products with the most order lines
+        return [(name, dict(self.products[name], interval=self.interval_days(self.products[name])))
+                for name, _ in self._top.top(k)]
+
+    def dump_state(self):
+        return {name: {
+            'lines': stats['lines'],
+            'orders': stats['orders'],
+            'first': stats['first'].isoformat() if stats['first'] else None,
+            'last': stats['last'].isoformat() if stats['last'] else None
+        } for name, stats in self.products.items()}
+
+    def load_state(self, data):
+        self.products = {name: {
+            'lines': stats['lines'],
+            'orders': stats['orders'],
+            'first': datetime.fromisoformat(stats['first']) if stats['first'] else None,
+            'last': datetime.fromisoformat(stats['last']) if stats['last'] else None
+        } for name, stats in data.items()}
+        self._top.rebuild({name: stats['lines'] for name, stats in self.products.items()})
+
+
+# Spending rollups per week, plus running totals for the
+# average line value, the order count and quantities per product. Reading
+# the last n weeks costs O(n) however long the order history is.
+class SpendingTotals:
+    TOP_SIZE = 20
+    RECENT_ORDERS = 1000
+
+    def __init__(self):
+        self.weekly = {}
+        self.last_week = None
+        self.quantities = {}
+        self.total_amount = 0.0
+        self.total_lines = 0
+        self.order_count = 0
+        self._top = TopCounter(self.TOP_SIZE)
+        # Order ids seen lately, so an order split across writes counts once
+        self._recent = OrderedDict()
+
+    def apply(self, frame):
+        totals = pd.to_numeric(frame['Total'], errors='coerce')
+        self.total_amount += float(totals.sum())
+        self.total_lines += int(totals.count())
+
+        dates = frame['OrderDate']
+        dated = dates.notna()
+        weeks = dates[dated].dt.to_period('W')
+        for week, amount in totals[dated].groupby(weeks.astype(str)).sum().items():
+            self.weekly[week] = self.weekly.get(week, 0.0) + float(amount)
+        if not weeks.empty and (self.last_week is None or weeks.max() > self.last_week):
+            self.last_week = weeks.max()
+
+        named = frame.dropna(subset=['ProductName'])
+        quantities = pd.to_numeric(named['Quantity'], errors='coerce')
+        for name, quantity in quantities.groupby(named['ProductName'].astype(str)).sum().items():
+            self.quantities[name] = self.quantities.get(name, 0) + _native(quantity)
+            self._top.update(name, self.quantities[name])
+
+        for order_id in frame['OrderID'].dropna().unique():
+            order_id = _native(order_id)
+            if order_id not in self._recent:
+                self.order_count += 1
+            self._recent[order_id] = True
+            self._recent.move_to_end(order_id)
+            if len(self._recent) > self.RECENT_ORDERS:
+                self._recent.popitem(last=False)
+
+    def rebuild(self, frame):
+        self.apply(frame)
+
+    def weekly_spending(self, weeks):
+        # The weeks with orders among the last n weeks that have data
+        if self.last_week is None:
+            return []
+        periods = (str(self.last_week - i) for i in range(weeks - 1, -1, -1))
+        return [{'OrderDate': p, 'Total': round(self.weekly[p], 2)} for p in periods if p in self.weekly]
+
+    def summary(self, weeks=12, top=5):
+        if not self.total_lines and not self.order_count:
+            return {}
+        return {
+            'weekly_spending': self.weekly_spending(weeks),
+            'top_products': [{'ProductName': name, 'Quantity': quantity}
+                             for name, quantity in self._top.top(top)],
+            'avg_order_value': round(self.total_amount / self.total_lines, 2) if self.total_lines else 0.0,
+            'order_count': self.order_count
+        }
+
+    def dump_state(self):
+        return {
+            'weekly': self.weekly,
+            'last_week': str(self.last_week) if self.last_week is not None else None,
+            'quantities': self.quantities,
+            'total_amount': self.total_amount,
+            'total_lines': self.total_lines,
+            'order_count': self.order_count,
+            'recent': list(self._recent)
+        }
+
+    def load_state(self, data):
+        self.weekly = data['weekly']
+        self.last_week = pd.Period(data['last_week'], freq='W') if data['last_week'] else None
+        self.quantities = data['quantities']
+        self.total_amount = data['total_amount']
+        self.total_lines = data['total_lines']
+        self.order_count = data['order_count']
+        self._recent = OrderedDict((order_id, True) for order_id in data['recent'])
+        self._top.rebuild(self.quantities)
+
+
+class CoPurchaseIndex(OrderIndex):
+    NAME = 'copurchase'
+    Partition = CoPurchaseCounts
+
+    def top_pairs(self, retailer_id, k=3):
+        return self.query(retailer_id, lambda counts: counts.top_pairs(k))
+
+
+class RestockIndex(OrderIndex):
+    NAME = 'restock'
+    Partition = RestockStats
+
+    def most_ordered(self, retailer_id, k=5):
+        return self.query(retailer_id, lambda stats: stats.most_ordered(k))
+
+
+class SpendingRollup(OrderIndex):
+    NAME = 'spending'
+    Partition = SpendingTotals
+
+    def summary(self, retailer_id, weeks=12, top=5):
+        return self.query(retailer_id, lambda totals: totals.summary(weeks, top))
+
+
+def count_pairs(order_ids, product_names):
+    # Vectorised co-purchase count over a full order history. Products are
+    # encoded as integer codes in name order, order lines are self-joined per
+    # order, and the (code_a, code_b) keys are reduced with a bincount.
+    # Returns the product names and a {(code_a, code_b): count} dict.
+    codes, products = pd.factorize(pd.Series(product_names).astype(str), sort=True)
+    orders, _ = pd.factorize(pd.Series(order_ids))
+    lines = pd.DataFrame({'order': orders, 'line': np.arange(len(codes)), 'code': codes})
+
+    pairs = lines.merge(lines, on='order')
+    pairs = pairs[pairs['line_x'] < pairs['line_y']]
+    a = np.minimum(pairs['code_x'].to_numpy(), pairs['code_y'].to_numpy()).astype(np.int64)
+    b = np.maximum(pairs['code_x'].to_numpy(), pairs['code_y'].to_numpy()).astype(np.int64)
+
+    n = len(products)
+    keys = a * n + b
+    if n * n <= BINCOUNT_MAX_KEYS:
+        totals = np.bincount(keys, minlength=n * n)
+        keys = np.flatnonzero(totals)
+        totals = totals[keys]
+    else:
+        keys, totals = np.unique(keys, return_counts=True)
+
+    counts = {(int(k // n), int(k % n)): int(t) for k, t in zip(keys, totals)}
+    return list(products), counts
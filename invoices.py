@@ -0,0 +1,175 @@
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+
+from atomic_files import write_bytes
+
+# Invoices are rendered once and kept on disk. A file is named after its
+# OrderID and a hash of everything printed on it, so it never goes stale:
+# if an order's rows change, the hash changes and a new file is rendered.
+
+INVOICE_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+# Batches smaller than this render in-process; a pool costs more to start
+MIN_POOL_BATCH = 8
+
+
+def _latin1(value):
+    # The core PDF fonts only cover latin-1
+    return str(value).encode('latin-1', 'replace').decode('latin-1')
+
+
+def make_invoice(order_id, rows, shop_name, location):
+    # The printable content of an invoice, from the order's rows, as plain
+    # values so it hashes the same way every time and pickles to workers
+    items = [{
+        'ProductName': str(row['ProductName']),
+        'Quantity': int(row['Quantity']),
+        'Price': round(float(row['Price']), 2),
+        'Total': round(float(row['Total']), 2)
+    } for row in rows]
+    order_date = pd.to_datetime(rows[0]['OrderDate']) if rows else None
+    return {
+        'OrderID': str(order_id),
+        'items': items,
+        'total_amount': round(sum(item['Total'] for item in items), 2),
+        'order_date': None if order_date is None or pd.isna(order_date) else order_date.strftime(INVOICE_DATE_FORMAT),
+        'shop_name': None if shop_name is None else str(shop_name),
+        'location': None if location is None else str(location)
+    }
+
+
+def invoice_digest(invoice):
+    data = json.dumps(invoice, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()[:20]
+
+
+def _draw_invoice(pdf, invoice):
+    pdf.add_page()
+    pdf.set_font("Arial", size=12)
+
+    pdf.cell(200, 10, txt="Nomii - Invoice", ln=1, align='C')
+    pdf.cell(200, 10, txt=_latin1(f"Order ID: {invoice['OrderID']}"), ln=1, align='L')
+    pdf.cell(200, 10, txt=f"Date: {invoice['order_date'] or 'N/A'}", ln=1, align='L')
+
+    pdf.cell(200, 10, txt=_latin1(f"Retailer: {invoice['shop_name']}"), ln=1, align='L')
+    pdf.cell(200, 10, txt=_latin1(f"Location: {invoice['location']}"), ln=1, align='L')
+
+    pdf.cell(200, 10, txt="Items:", ln=1, align='L')
+    pdf.cell(100, 10, txt="Product", border=1)
+    pdf.cell(30, 10, txt="Qty", border=1)
+    pdf.cell(30, 10, txt="Price", border=1)
+    pdf.cell(30, 10, txt="Total", border=1, ln=1)
+
+    for item in invoice['items']:
+        pdf.cell(100, 10, txt=_latin1(item['ProductName']), border=1)
+        pdf.cell(30, 10, txt=str(item['Quantity']), border=1)
+        pdf.cell(30, 10, txt=f"{item['Price']:.2f}", border=1)
+        pdf.cell(30, 10, txt=f"{item['Total']:.2f}", border=1, ln=1)
+
+    pdf.cell(160, 10, txt="Total Amount:", border=1)
+    pdf.cell(30, 10, txt=f"{invoice['total_amount']:.2f}", border=1, ln=1)
+
+
+def render_invoices(invoices):
+    # One PDF (as bytes) with a page per invoice. fpdf is only imported
+    # once something is rendered (often only in pool workers).
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    for invoice in invoices:
+        _draw_invoice(pdf, invoice)
+    return pdf.output(dest='S').encode('latin-1')
+
+
+def render_invoice(invoice):
+    return render_invoices([invoice])
+
+
+def _render_to(path, invoice):
+    # Module level so it can run in a worker process
+    write_bytes(render_invoice(invoice), path)
+    return path
+
+
+class InvoiceCache:
+    def __init__(self, directory, processes=None):
+        self.directory = directory
+        self.processes = processes
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _prefix(self, order_id):
+        return re.sub(r'[^A-Za-z0-9_-]', '_', str(order_id))
+
+    def path(self, invoice, digest=None):
+        digest = digest or invoice_digest(invoice)
+        return os.path.join(self.directory, f"{self._prefix(invoice['OrderID'])}-{digest}.pdf")
+
+    def get(self, invoice):
+        # (path, digest) of the invoice's PDF, rendering it on first use
+        digest = invoice_digest(invoice)
+        path = self.path(invoice, digest)
+        if not os.path.exists(path):
+            self._discard_old(invoice['OrderID'], path)
+            _render_to(path, invoice)
+        return path, digest
+
+    def get_many(self, invoices):
+        # Paths for invoices, in order. Missing ones are rendered across a
+        # process pool (FPDF is pure Python, so threads would not help).
+        paths = [self.path(invoice) for invoice in invoices]
+        missing = [(path, invoice) for path, invoice in zip(paths, invoices) if not os.path.exists(path)]
+        for path, invoice in missing:
+            self._discard_old(invoice['OrderID'], path)
+        if len(missing) < MIN_POOL_BATCH:
+            for path, invoice in missing:
+                _render_to(path, invoice)
+            return paths
+
+        workers = self.processes or os.cpu_count() or 1
+        pool = self._executor(workers)
+        try:
+            list(pool.map(_render_to, *zip(*missing), chunksize=max(1, len(missing) // (workers * 4))))
+        except BrokenProcessPool:
+            # A worker died; the next batch starts a fresh pool
+            with self._pool_lock:
+                if self._pool is pool:
+                    self._pool = None
+            raise
+        return paths
+
+    def _executor(self, workers):
+        # One pool for the life of the cache, started on first use. Workers
+        # are spawned, not forked: the app is multi-threaded, and a fork
+        # copies whatever locks its other threads hold at that moment.
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+
+    def write_zip(self, invoices, path):
+        # Cached PDFs are already compressed, so they are stored as-is
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED) as archive:
+            for invoice, pdf_path in zip(invoices, self.get_many(invoices)):
+                archive.write(pdf_path, f"invoice_{self._prefix(invoice['OrderID'])}.pdf")
+        return path
+
+    def _discard_old(self, order_id, keep):
+        # Renders of earlier contents of the same order
+        for old in glob.glob(os.path.join(self.directory, f"{glob.escape(self._prefix(order_id))}-*.pdf")):
+            if old != keep:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
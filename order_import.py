@@ -0,0 +1,166 @@
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+# Bulk import of order lines exported by other systems. A file is read in
+# one go, validated column by column against the catalog, given OrderIDs
+# from one reserved block and written with a single append.
+
+ORDER_COLUMNS = ['OrderID', 'RetailerID', 'ProductID', 'ProductName', 'Quantity', 'Price', 'Total', 'OrderDate', 'Status']
+REQUIRED_COLUMNS = ['RetailerID', 'ProductID', 'Quantity', 'OrderDate']
+# Imported history is assumed to have been fulfilled unless it says otherwise
+DEFAULT_STATUS = 'Delivered'
+
+# Identifier columns stay text even when they look numeric
+_ID_DTYPES = {'OrderID': str, 'RetailerID': str, 'ProductID': str}
+
+READERS = {
+    '.csv': lambda path: pd.read_csv(path, dtype=_ID_DTYPES),
+    '.xlsx': lambda path: pd.read_excel(path, dtype=_ID_DTYPES),
+    '.parquet': pd.read_parquet
+}
+
+
+def read_orders_file(path, name=None):
+    # path may also be an uploaded file object, with its file name as name
+    name = name or path
+    ext = os.path.splitext(name)[1].lower()
+    if ext not in READERS:
+        raise ValueError(f"Unsupported file type {ext or name}; expected one of {', '.join(READERS)}")
+    return READERS[ext](path)
+
+
+def _normalize_columns(df):
+    # "order_id", "Order ID" and "orderid" all name OrderID
+    known = {c.lower(): c for c in ORDER_COLUMNS}
+    known.update({'qty': 'Quantity', 'sku': 'ProductID', 'date': 'OrderDate'})
+    return df.rename(columns=lambda c: known.get(re.sub(r'[^a-z]', '', str(c).lower()), c))
+
+
+def _text(series):
+    # Stripped strings with blanks as missing
+    text = series.astype('string').str.strip()
+    return text.mask(text == '')
+
+
+def _parse_dates(series):
+    # ISO dates are parsed in one pass; anything else falls back to
+    # per-value parsing for just those rows
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    dates = pd.to_datetime(series, format='ISO8601', errors='coerce')
+    retry = dates.isna() & series.notna()
+    if retry.any():
+        dates[retry] = pd.to_datetime(series[retry].astype(str), format='mixed', errors='coerce')
+    return dates
+
+
+def validate_orders(df, catalog, retailer_id=None):
+    # Returns (orders, errors). orders holds the valid lines in the orders
+    # schema plus a SourceOrder key (OrderID is not assigned yet); errors
+    # has the 1-based Row and the first problem found on each bad line.
+    # With retailer_id, every line is taken to be that retailer's.
+    df = _normalize_columns(df).reset_index(drop=True)
+    if retailer_id is not None:
+        df['RetailerID'] = retailer_id
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}")
+
+    errors = pd.Series('', index=df.index, dtype=object)
+
+    def flag(mask, message):
+        errors[mask & (errors == '')] = message
+
+    retailer_ids = _text(df['RetailerID'])
+    flag(retailer_ids.isna(), 'Missing RetailerID')
+
+    catalog = catalog.drop_duplicates('ProductID').set_index('ProductID')
+    product_ids = _text(df['ProductID'])
+    flag(~product_ids.isin(catalog.index), 'Unknown ProductID')
+
+    quantities = pd.to_numeric(df['Quantity'], errors='coerce')
+    flag(~(quantities > 0) | (quantities % 1 != 0), 'Invalid Quantity')
+
+    catalog_prices = product_ids.map(catalog['Price']).astype(float)
+    if 'Price' in df.columns:
+        prices = pd.to_numeric(df['Price'], errors='coerce')
+        flag(df['Price'].notna() & ~(prices >= 0), 'Invalid Price')
+        prices = prices.fillna(catalog_prices)
+    else:
+        prices = catalog_prices
+
+    dates = _parse_dates(df['OrderDate'])
+    flag(dates.isna(), 'Invalid OrderDate')
+
+    names = product_ids.map(catalog['Name'])
+    if 'ProductName' in df.columns:
+        names = _text(df['ProductName']).fillna(names)
+    totals = (quantities * prices).round(2)
+    if 'Total' in df.columns:
+        totals = pd.to_numeric(df['Total'], errors='coerce').fillna(totals)
+    statuses = _text(df['Status']).fillna(DEFAULT_STATUS) if 'Status' in df.columns else DEFAULT_STATUS
+
+    orders = pd.DataFrame({
+        'RetailerID': retailer_ids,
+        'ProductID': product_ids,
+        'ProductName': names,
+        'Quantity': quantities,
+        'Price': prices,
+        'Total': totals,
+        'OrderDate': dates,
+        'Status': statuses
+    })
+    # Lines of one source order share an OrderID; without one, a retailer's
+    # lines with the same timestamp are taken to be one order
+    source = _text(df['OrderID']) if 'OrderID' in df.columns else None
+    if source is not None and source.notna().any():
+        orders['SourceOrder'] = source.fillna('@' + dates.astype(str))
+    else:
+        orders['SourceOrder'] = dates.astype(str)
+
+    valid = errors == ''
+    failed = pd.DataFrame({'Row': np.flatnonzero(~valid.to_numpy()) + 1, 'Error': errors[~valid].to_numpy()})
+    orders = orders[valid].reset_index(drop=True)
+    orders['Quantity'] = orders['Quantity'].astype(int)
+    return orders, failed
+
+
+def assign_order_ids(orders, allocator):
+    # One new OrderID per (RetailerID, SourceOrder), taken from one reserved block
+    groups = orders.groupby(['RetailerID', 'SourceOrder'], sort=False).ngroup().to_numpy()
+    count = int(groups.max()) + 1 if len(groups) else 0
+    ids = np.array(allocator.reserve(count), dtype=object) if count else np.array([], dtype=object)
+    orders = orders.drop(columns='SourceOrder')
+    orders.insert(0, 'OrderID', ids[groups])
+    return orders, count
+
+
+def import_orders(storage, table, df, catalog, allocator, skip_invalid=False, retailer_id=None):
+    # Validates df and appends its valid lines to table. Unless skip_invalid
+    # is set, nothing is written when any line is invalid. Returns a summary
+    # with per-phase timings and the overall rows/sec.
+    started = time.perf_counter()
+    orders, errors = validate_orders(df, catalog, retailer_id)
+    validated = time.perf_counter()
+
+    summary = {'rows': len(df), 'imported': 0, 'orders': 0, 'errors': errors}
+    if len(errors) and not skip_invalid:
+        summary['validate_seconds'] = validated - started
+        return summary
+
+    orders, summary['orders'] = assign_order_ids(orders, allocator)
+    if len(orders):
+        storage.append(table, orders[ORDER_COLUMNS].to_dict('records'))
+    finished = time.perf_counter()
+
+    summary.update({
+        'imported': len(orders),
+        'validate_seconds': validated - started,
+        'write_seconds': finished - validated,
+        'rows_per_second': len(df) / max(finished - started, 1e-9)
+    })
+    return summary
@@ -0,0 +1,311 @@
+import re
+import threading
+from bisect import bisect_left
+
+import numpy as np
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Match strengths; a product's score is the sum over the query's tokens
+EXACT_SCORE = 3.0
+PREFIX_SCORE = 2.0
+SUBSTRING_SCORE = 1.5
+
+# Fuzzy matches need at least this trigram (Jaccard) similarity, and only
+# the closest few vocabulary tokens are tried for each query token
+MIN_SIMILARITY = 0.3
+MAX_FUZZY_TOKENS = 20
+# Tokens one edit away (a typo trigrams miss in short words, e.g. "tex"
+# for "tax") score this much; shorter tokens are not edit-matched
+EDIT_SCORE = 1.0
+MIN_EDIT_LENGTH = 3
+
+# resolve() compares at most this many of the best-scoring products with
+# the spoken name by edit distance
+RESOLVE_CANDIDATES = 10
+STOP_WORDS = {'a', 'an', 'the', 'of', 'some', 'please'}
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(str(text).lower())
+
+
+def trigrams(token):
+    # Padded so short tokens and word starts still produce trigrams
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def deletes(token):
+    # token with any one character removed; two tokens within one edit of
+    # each other share at least one of these (or one is the other)
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+def edit_distance(a, b):
+    # Levenshtein distance
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def _csr(groups, size):
+    # groups[i] is a list of ints; returns (offsets, flat) so that
+    # flat[offsets[i]:offsets[i + 1]] == sorted(groups[i])
+    offsets = np.zeros(size + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(g) for g in groups])
+    flat = np.fromiter((v for g in groups for v in sorted(g)), dtype=np.int32, count=offsets[-1])
+    return offsets, flat
+
+
+# An immutable snapshot of the catalog and its indexes. Searches read
+# whichever snapshot is current, so a rebuild never blocks them.
+class _Catalog:
+    def __init__(self, df, field):
+        df = df.reset_index(drop=True)
+        if 'Price' in df.columns:
+            df['Price'] = df['Price'].astype(float)
+        self.records = df.to_dict('records')
+        self.size = len(df)
+
+        names = df[field].fillna('').astype(str) if field in df.columns else ['' for _ in range(self.size)]
+        self.normalized_names = [' '.join(tokenize(name)) for name in names]
+        self.name_lengths = np.array([len(name) for name in self.normalized_names], dtype=np.int64)
+        categories = df['Category'] if 'Category' in df.columns else None
+        self.categories = sorted(categories.dropna().unique().tolist()) if categories is not None else []
+        self.category_codes = {c: i for i, c in enumerate(self.categories)}
+        self.row_category = (np.array([self.category_codes.get(c, -1) for c in categories], dtype=np.int32)
+                             if categories is not None else np.full(self.size, -1, dtype=np.int32))
+        # Ties are ranked by name, then catalog order
+        self.name_rank = np.empty(self.size, dtype=np.int64)
+        self.name_rank[np.argsort(np.array([n.lower() for n in names], dtype=object), kind='stable')] = \
+            np.arange(self.size)
+
+        # Inverted index: token -> product rows, as one CSR array ordered by
+        # token so every prefix range maps to a contiguous slice
+        postings = {}
+        for row, name in enumerate(names):
+            for token in set(tokenize(name)):
+                postings.setdefault(token, []).append(row)
+        self.vocabulary = sorted(postings)
+        self.row_offsets, self.rows = _csr([postings[t] for t in self.vocabulary], len(self.vocabulary))
+
+        # Trigram index over the vocabulary (not the products) for fuzzy lookups
+        by_trigram = {}
+        for token_id, token in enumerate(self.vocabulary):
+            for gram in trigrams(token):
+                by_trigram.setdefault(gram, []).append(token_id)
+        self.trigram_tokens = {g: np.array(ids, dtype=np.int32) for g, ids in by_trigram.items()}
+        self.token_trigram_count = np.array([len(trigrams(t)) for t in self.vocabulary], dtype=np.int32)
+
+        # Deletion index over the vocabulary: each token and its one-character
+        # deletions point back to it, so one-edit neighbours are a few lookups
+        by_delete = {}
+        for token_id, token in enumerate(self.vocabulary):
+            if len(token) >= MIN_EDIT_LENGTH:
+                for key in deletes(token) | {token}:
+                    by_delete.setdefault(key, []).append(token_id)
+        self.delete_tokens = by_delete
+
+    def _edit_neighbours(self, token):
+        # Vocabulary ids of tokens exactly one edit from token
+        if len(token) < MIN_EDIT_LENGTH:
+            return []
+        ids = {i for key in deletes(token) | {token} for i in self.delete_tokens.get(key, ())}
+        return sorted(i for i in ids if edit_distance(token, self.vocabulary[i]) == 1)
+
+    def _token_rows(self, lo, hi):
+        # Sorted, distinct rows of vocabulary tokens lo..hi-1
+        rows = self.rows[self.row_offsets[lo]:self.row_offsets[hi]]
+        return np.unique(rows) if hi - lo > 1 else rows
+
+    def match(self, token):
+        # [(rows, score)] for one query token: exact, then other prefixes,
+        # and only if neither matches, substrings and close misspellings
+        lo = bisect_left(self.vocabulary, token)
+        hi = bisect_left(self.vocabulary, token + '{', lo)  # '{' sorts after [a-z0-9]
+        if lo < hi:
+            if self.vocabulary[lo] == token:
+                return [(self._token_rows(lo, lo + 1), EXACT_SCORE), (self._token_rows(lo + 1, hi), PREFIX_SCORE)]
+            return [(self._token_rows(lo, hi), PREFIX_SCORE)]
+
+        grams = [g for g in trigrams(token) if g in self.trigram_tokens]
+        if not grams:
+            return self._edit_matches(token, set())
+        shared = np.bincount(np.concatenate([self.trigram_tokens[g] for g in grams]),
+                             minlength=len(self.vocabulary))
+        candidates = np.flatnonzero(shared)
+        similarity = shared[candidates] / (len(trigrams(token)) + self.token_trigram_count[candidates]
+                                           - shared[candidates])
+        order = np.argsort(-similarity, kind='stable')
+        matches = []
+        matched = set()
+        for i in order:
+            token_id = candidates[i]
+            if token in self.vocabulary[token_id]:
+                score = SUBSTRING_SCORE
+            elif similarity[i] >= MIN_SIMILARITY:
+                score = float(similarity[i])
+            else:
+                continue
+            matches.append((self._token_rows(token_id, token_id + 1), score))
+            matched.add(int(token_id))
+            if len(matches) >= MAX_FUZZY_TOKENS:
+                return matches
+        return matches + self._edit_matches(token, matched)[:MAX_FUZZY_TOKENS - len(matches)]
+
+    def _edit_matches(self, token, matched):
+        return [(self._token_rows(i, i + 1), EDIT_SCORE) for i in self._edit_neighbours(token) if i not in matched]
+
+    def _token_scores(self, token):
+        # Sorted product rows matching token and the best score for each
+        matches = [(rows, score) for rows, score in self.match(token) if len(rows)]
+        if not matches:
+            return np.array([], dtype=np.int32), np.array([])
+        if len(matches) == 1:
+            rows, score = matches[0]
+            return rows, np.full(len(rows), score)
+        rows = np.concatenate([r for r, _ in matches])
+        scores = np.concatenate([np.full(len(r), score) for r, score in matches])
+        order = np.lexsort((-scores, rows))
+        rows, scores = rows[order], scores[order]
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = rows[1:] != rows[:-1]
+        return rows[first], scores[first]
+
+    def _scores(self, tokens, require_all=True):
+        # (rows, scores) of the products matching every token (or, without
+        # require_all, any token), scores summed over the tokens
+        rows = scores = None
+        for token in tokens:
+            token_rows, token_scores = self._token_scores(token)
+            if rows is None:
+                rows, scores = token_rows, token_scores
+            elif require_all:
+                rows, i, j = np.intersect1d(rows, token_rows, assume_unique=True, return_indices=True)
+                scores = scores[i] + token_scores[j]
+            else:
+                rows = np.concatenate([rows, token_rows])
+                scores = np.concatenate([scores, token_scores])
+            if require_all and not len(rows):
+                break
+        if not require_all and rows is not None and len(rows):
+            rows, inverse = np.unique(rows, return_inverse=True)
+            scores = np.bincount(inverse, weights=scores)
+        return rows, scores
+
+    def resolve(self, name):
+        # The row of the product a spoken name most likely means, or None.
+        # Products matching all of its words are preferred to those matching
+        # some; among the best scoring, the name closest by edit distance wins.
+        tokens = [t for t in dict.fromkeys(tokenize(name)) if t not in STOP_WORDS]
+        if not tokens:
+            return None
+        rows, scores = self._scores(tokens)
+        if not len(rows):
+            rows, scores = self._scores(tokens, require_all=False)
+            if not len(rows):
+                return None
+        rows = rows[np.round(scores, 3) == np.round(scores.max(), 3)]
+        spoken = ' '.join(tokens)
+        if len(rows) > RESOLVE_CANDIDATES:
+            # The length gap is a lower bound on the edit distance
+            gap = np.abs(self.name_lengths[rows] - len(spoken))
+            rows = rows[np.argpartition(gap, RESOLVE_CANDIDATES - 1)[:RESOLVE_CANDIDATES]]
+        return min(rows.tolist(), key=lambda row: (edit_distance(spoken, self.normalized_names[row]),
+                                                   self.name_rank[row]))
+
+    def search(self, query, category=''):
+        # (rows, rank_key) for the products matching every query token and
+        # the category. rank_key is None when there is nothing to rank by
+        # (catalog order applies), otherwise lower keys are better matches.
+        empty = np.array([], dtype=np.int64)
+        if category:
+            code = self.category_codes.get(category)
+            if code is None:
+                return empty, None
+            allowed = self.row_category == code
+        else:
+            allowed = None
+
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return (np.arange(self.size) if allowed is None else np.flatnonzero(allowed)), None
+
+        rows, scores = self._scores(tokens)
+        if not len(rows):
+            return empty, None
+        if allowed is not None:
+            keep = allowed[rows]
+            rows, scores = rows[keep], scores[keep]
+
+        if not len(rows):
+            return empty, None
+        # Higher score first, ties by name: folded into one integer key
+        key = -np.round(scores * 1000).astype(np.int64) * max(self.size, 1) + self.name_rank[rows]
+        return rows, key
+
+    @staticmethod
+    def page(rows, key, start, stop):
+        # rows[start:stop] in rank order, without sorting the whole result
+        if key is None:
+            return rows[start:stop]
+        if stop < len(rows):
+            best = np.argpartition(key, stop - 1)[:stop]
+            rows, key = rows[best], key[best]
+        return rows[np.argsort(key)][start:stop]
+
+
+# Product search over the catalog table. The catalog is indexed once and
+# rebuilt whenever storage reports a new version of the table; search()
+# returns one page of matching products plus paging details.
+class ProductSearchIndex:
+    def __init__(self, storage, table, field='Name'):
+        self.storage = storage
+        self.table = table
+        self.field = field
+        self._catalog = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    def catalog(self):
+        version = self.storage.version(self.table)
+        # Backends that cannot version a table get a rebuild on every call
+        if self._catalog is None or version is None or version != self._version:
+            with self._lock:
+                if self._catalog is None or version is None or version != self._version:
+                    self._catalog = _Catalog(self.storage.read(self.table), self.field)
+                    self._version = version
+        return self._catalog
+
+    def categories(self):
+        return self.catalog().categories
+
+    def resolve(self, names):
+        # The best matching product record (or None) for each name, all
+        # looked up in one catalog snapshot
+        catalog = self.catalog()
+        rows = [catalog.resolve(name) for name in names]
+        return [None if row is None else catalog.records[row] for row in rows]
+
+    def search(self, query='', category='', page=1, per_page=24):
+        catalog = self.catalog()
+        rows, key = catalog.search(query, category)
+        total = len(rows)
+        pages = max(1, -(-total // per_page))
+        page = min(max(1, page), pages)
+        start = (page - 1) * per_page
+        rows = catalog.page(rows, key, start, start + per_page)
+        return {
+            'products': [catalog.records[row] for row in rows.tolist()],
+            'total': total,
+            'page': page,
+            'pages': pages,
+            'per_page': per_page
+        }
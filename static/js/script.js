@@ -139,6 +139,33 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 });
 
+// Voice orders are queued on the server; this resolves with the finished
+// job, polling its status. It rejects if the job failed, cannot be read
+// or is still not finished after VOICE_JOB_MAX_POLLS polls.
+const VOICE_JOB_POLL_MS = 500;
+const VOICE_JOB_MAX_POLLS = 300;
+
+function waitForVoiceJob(job) {
+    return new Promise((resolve, reject) => {
+        let polls = 0;
+        const poll = () => fetch(job.status_url)
+            .then(response => response.json().then(data => {
+                if (!response.ok || data.success === false) {
+                    throw new Error(data.error || `Voice order status unavailable (${response.status})`);
+                }
+                if (data.status === 'done') {
+                    resolve(data);
+                } else if (++polls >= VOICE_JOB_MAX_POLLS) {
+                    throw new Error('Voice order is taking too long, please try again');
+                } else {
+                    setTimeout(poll, VOICE_JOB_POLL_MS);
+                }
+            }))
+            .catch(reject);
+        poll();
+    });
+}
+
 // Voice order functionality
 function startVoiceOrder() {
     const voiceOrderBtn = document.getElementById('voiceOrderBtn');
@@ -174,6 +201,7 @@ function startVoiceOrder() {
             body: JSON.stringify({ transcript: transcript })
         })
         .then(response => response.json())
+        .then(job => job.success ? waitForVoiceJob(job) : job)
         .then(data => {
             if (data.success) {
                 voiceOrderResult.innerHTML = `<div class="alert alert-success">${data.message}</div>`;
@@ -0,0 +1,758 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from atomic_files import FileLock, atomic_write, write_json
+from table_cache import table_cache, read_table, parse_dates
+
+
+# datetime64[ns] NaT viewed as an integer
+_NAT = np.datetime64('NaT', 'ns').view('i8')
+
+
+def _ns(value):
+    # A date (or ISO string) as datetime64[ns] integer
+    return pd.Timestamp(value).as_unit('ns').value
+
+
+def _json_default(obj):
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat() if not pd.isna(obj) else None
+    if isinstance(obj, np.integer):
+        return int(obj)
+    if isinstance(obj, np.floating):
+        return float(obj)
+    raise TypeError(f"Cannot serialize {type(obj).__name__}")
+
+
+def _to_sql_value(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if isinstance(value, (datetime, date, np.integer, np.floating)):
+        return None if pd.isna(value) else _json_default(value)
+    return value
+
+
+def _max_numeric_id(series):
+    # IDs are plain integers or strings with a numeric suffix ("O042")
+    numbers = pd.to_numeric(series, errors='coerce')
+    suffixes = pd.to_numeric(series.astype(str).str.extract(r'(\d+)$')[0], errors='coerce')
+    numbers = numbers.fillna(suffixes)
+    return int(numbers.max()) if numbers.notna().any() else 0
+
+
+def write_workbook(df, path):
+    # Swapped in whole so readers never see half a file
+    with atomic_write(path, suffix='.tmp.xlsx') as tmp_path:
+        df.to_excel(tmp_path, index=False)
+    table_cache.put(path, df)
+
+
+def _concat_rows(df, rows):
+    if not rows:
+        return df
+    new = parse_dates(pd.DataFrame(rows))
+    if df.empty:
+        return new.reindex(columns=list(dict.fromkeys([*df.columns, *new.columns])))
+    return pd.concat([df, new], ignore_index=True)
+
+
+def _upsert_frame(df, column, value, values):
+    # Set values on the rows where column == value, or add one such row
+    mask = df[column] == value if column in df.columns else pd.Series(False, index=df.index)
+    if not mask.any():
+        return _concat_rows(df, [{column: value, **values}])
+    for key, new_value in values.items():
+        if key in df.columns:
+            df[key] = df[key].astype(object)
+        df.loc[mask, key] = new_value
+    return df
+
+
+def _resolve_update(df, column, value, update):
+    # df holds the rows where column == value
+    values = update(df.iloc[0].to_dict() if not df.empty else None)
+    return None if values is None else (column, value, values)
+
+
+class Storage:
+    # Tables are addressed by their workbook path (PRODUCTS_FILE, ORDERS_FILE, ...)
+    # and schema maps each of them to its column list.
+    def __init__(self, schema, data_dir='data'):
+        self.schema = schema
+        self.data_dir = data_dir
+        self._indexes = {}
+        self._index_lock = threading.Lock()
+
+    def read(self, table):
+        raise NotImplementedError
+
+    def version(self, table):
+        # A value that changes whenever table does, or None if the backend
+        # cannot tell cheaply (find() then scans the table every time)
+        return None
+
+    def write_batch(self, ops):
+        # ops is a list of ('append', table, rows), ('replace', table, df),
+        # ('upsert', table, (key_column, key_value, values)) or
+        # ('update', table, (key_column, key_value, update)). update(row) gets
+        # the current row as a dict (None if there is none) while the write
+        # holds its lock, and returns the values to upsert or None to skip.
+        raise NotImplementedError
+
+    def append(self, table, rows):
+        self.write_batch([('append', table, rows)])
+
+    def replace(self, table, df):
+        self.write_batch([('replace', table, df)])
+
+    def upsert(self, table, column, value, values):
+        self.write_batch([('upsert', table, (column, value, values))])
+
+    def _updated(self, table, column, value, update):
+        # An 'update' op as the 'upsert' data it resolves to, or None
+        return _resolve_update(self.find(table, column, value), column, value, update)
+
+    def read_since(self, table, position):
+        # Rows appended after position, and the position to resume from.
+        # Here a position is a row count; backends may use something else.
+        df = self.read(table)
+        return df.iloc[position:].reset_index(drop=True), len(df)
+
+    def count(self, table):
+        return len(self.read(table))
+
+    def last_position(self, table):
+        # The position read_since() would return right now
+        return self.count(table)
+
+    def _matching(self, table, version, column, values):
+        # (df, positions of the rows where column is one of values). Row
+        # positions are grouped by column value once per table version, so
+        # repeated lookups (e.g. by RetailerID) only touch matching rows.
+        if version is None:
+            df = self.read(table)
+            if column not in df.columns:
+                return df, np.array([], dtype=np.int64)
+            return df, np.flatnonzero(df[column].isin(values).to_numpy())
+
+        with self._index_lock:
+            _, df, columns = self._cached(table, version)
+            if column not in columns:
+                columns[column] = df.groupby(column, sort=False).indices if column in df.columns else {}
+            positions = columns[column]
+
+        hits = [positions[v] for v in values if v in positions]
+        return df, np.sort(np.concatenate(hits)) if hits else np.array([], dtype=np.int64)
+
+    def _cached(self, table, version):
+        # (version, df, derived structures) for table; caller holds _index_lock
+        cached = self._indexes.get(table)
+        if cached is None or cached[0] != version:
+            cached = self._indexes[table] = (version, self.read(table), {})
+        return cached
+
+    def find(self, table, column, value):
+        # Rows where column equals value, or is one of value if it is a list
+        values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+        df, rows = self._matching(table, self.version(table), column, values)
+        return df.iloc[rows].reset_index(drop=True)
+
+    def page(self, table, column, value, order_by, after=None, limit=50, columns=None,
+             equals=None, start=None, end=None):
+        # Up to limit rows where column == value, latest order_by (a date
+        # column) first, as (df, key). Ties are broken by storage position,
+        # later first. key identifies the page's last row: pass it back as
+        # after for the next page. It is None once there are no more rows.
+        # Only columns (default: all) are copied out of the table.
+        #
+        # equals maps other columns to the value they must hold (e.g. Status)
+        # and start/end limit order_by to [start, end), which leaves out rows
+        # without a date.
+        version = self.version(table)
+        df, rows = self._matching(table, version, column, [value])
+        index = self._sorted_index(table, version, df, rows, (column, value, order_by))
+        dates, rows = index['dates'], index['rows']
+
+        # Everything happens on a window [lo, hi) of the ascending arrays
+        lo, hi = 0, len(rows)
+        if start is not None or end is not None:
+            lo = int(np.searchsorted(dates, _NAT, 'right'))
+        if start is not None:
+            lo = max(lo, int(np.searchsorted(dates, _ns(start), 'left')))
+        if end is not None:
+            hi = int(np.searchsorted(dates, _ns(end), 'left'))
+        if after is not None:
+            after_date = _NAT if after[0] is None else _ns(after[0])
+            first, last = np.searchsorted(dates, after_date, 'left'), np.searchsorted(dates, after_date, 'right')
+            hi = min(hi, int(first + np.searchsorted(rows[first:last], after[1], 'left')))
+        hi = max(lo, hi)
+
+        if equals:
+            # Category codes per column, aligned with the sorted rows
+            mask = np.ones(hi - lo, dtype=bool)
+            for key_column, key_value in equals.items():
+                codes, categories = self._category_codes(index, df, key_column)
+                code = categories.get(key_value)
+                mask &= codes[lo:hi] == code if code is not None else False
+            picks = lo + np.flatnonzero(mask)
+        else:
+            picks = np.arange(max(lo, hi - limit - 1), hi)
+        more = len(picks) > limit
+        picks = picks[-limit:]
+
+        result = df.iloc[rows[picks][::-1]]
+        if columns is not None:
+            result = result[[c for c in columns if c in result.columns]]
+        key = None
+        if more:
+            last_date = dates[picks[0]]
+            key = (None if last_date == _NAT else pd.Timestamp(last_date).isoformat(), int(rows[picks[0]]))
+        return result.reset_index(drop=True), key
+
+    def _sorted_index(self, table, version, df, rows, sort_key):
+        # rows ascending by (date, position), with their dates as ns integers.
+        # Missing dates sort first, i.e. last when read backwards. Kept per
+        # table version next to find()'s groupby positions.
+        with self._index_lock:
+            index = self._cached(table, version)[2].get(sort_key) if version is not None else None
+        if index is None:
+            dates = pd.to_datetime(df[sort_key[2]].iloc[rows]).astype('datetime64[ns]').to_numpy().view('i8')
+            order = np.lexsort((rows, dates))
+            index = {'dates': dates[order], 'rows': rows[order]}
+            if version is not None:
+                with self._index_lock:
+                    self._cached(table, version)[2][sort_key] = index
+        return index
+
+    @staticmethod
+    def _category_codes(index, df, column):
+        # (codes, {value: code}) for column over index['rows'], built once
+        if column not in index:
+            values = df[column].iloc[index['rows']] if column in df.columns else pd.Series([None] * len(index['rows']))
+            codes, uniques = pd.factorize(values)
+            index[column] = (codes, {v: i for i, v in enumerate(uniques)})
+        return index[column]
+
+    def scan(self, table, column, value, date_column=None, start=None, end=None, chunk_size=5000):
+        # Rows where column == value, in storage order, as DataFrames of at
+        # most chunk_size rows. start/end limit date_column to [start, end).
+        # Exports iterate this so a whole history is never copied at once.
+        df, rows = self._matching(table, self.version(table), column, [value])
+        if date_column is not None and (start is not None or end is not None):
+            dates = pd.to_datetime(df[date_column].iloc[rows])
+            keep = dates.notna().to_numpy().copy()
+            if start is not None:
+                keep &= (dates >= pd.Timestamp(start)).to_numpy()
+            if end is not None:
+                keep &= (dates < pd.Timestamp(end)).to_numpy()
+            rows = rows[keep]
+        for first in range(0, len(rows), chunk_size):
+            yield df.iloc[rows[first:first + chunk_size]].reset_index(drop=True)
+
+    def export_excel(self, table, path=None):
+        write_workbook(self.read(table), path or table)
+
+    def reserve_ids(self, table, column, count=1):
+        # Reserve count consecutive ids for table.column and return the first.
+        # Counters live in sequences.json under an exclusive file lock and are
+        # seeded from the largest id already in the table.
+        path = os.path.join(self.data_dir, 'sequences.json')
+        name = f"{table}:{column}"
+        with FileLock(os.path.join(self.data_dir, 'sequences.lock')):
+            try:
+                with open(path) as f:
+                    sequences = json.load(f)
+            except FileNotFoundError:
+                sequences = {}
+            last = sequences.get(name)
+            if last is None:
+                last = _max_numeric_id(self.read(table)[column])
+            sequences[name] = last + count
+            write_json(sequences, path)
+        return last + 1
+
+    def compact(self):
+        pass
+
+
+class ExcelStorage(Storage):
+    # The original layout: every append rewrites the whole workbook
+    def read(self, table):
+        return read_table(table)
+
+    def version(self, table):
+        st = os.stat(table)
+        return (st.st_mtime_ns, st.st_size)
+
+    # Ops are applied one workbook at a time, so a batch is not atomic here
+    def write_batch(self, ops):
+        for op, table, data in ops:
+            if op == 'replace':
+                write_workbook(data, table)
+            elif op == 'upsert':
+                write_workbook(_upsert_frame(read_table(table), *data), table)
+            elif op == 'update':
+                data = self._updated(table, *data)
+                if data is not None:
+                    write_workbook(_upsert_frame(read_table(table), *data), table)
+            else:
+                write_workbook(_concat_rows(read_table(table), list(data)), table)
+
+
+class JournalStorage(Storage):
+    # Workbooks act as snapshots and every write is a single appended JSON line
+    # in a shared journal, so a write costs O(rows written) regardless of how
+    # much history exists. The workbooks are only rewritten by compact().
+    #
+    # The checkpoint file records the current journal generation and, per
+    # table, the journal offset already folded into its workbook.
+    def __init__(self, schema, data_dir='data'):
+        super().__init__(schema, data_dir)
+        self.checkpoint_path = os.path.join(data_dir, 'journal.checkpoint.json')
+        self.lock_path = os.path.join(data_dir, 'journal.lock')
+        self._lock = threading.RLock()
+        self._checkpoint = {'generation': 0, 'offsets': {}}
+        self._checkpoint_stamp = None
+        self._offset = 0
+        self._pending = {}
+        self._frames = {}
+
+    @property
+    def journal_path(self):
+        return os.path.join(self.data_dir, f"journal-{self._checkpoint['generation']}.jsonl")
+
+    def _file_lock(self):
+        return FileLock(self.lock_path)
+
+    def _reset(self):
+        self._offset = 0
+        self._pending = {}
+
+    def _load_checkpoint(self):
+        try:
+            st = os.stat(self.checkpoint_path)
+            stamp = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            stamp = None
+        if stamp == self._checkpoint_stamp:
+            return
+
+        previous = self._checkpoint
+        if stamp is None:
+            self._checkpoint = {'generation': 0, 'offsets': {}}
+        else:
+            with open(self.checkpoint_path) as f:
+                self._checkpoint = json.load(f)
+        self._checkpoint_stamp = stamp
+
+        if self._checkpoint['generation'] != previous['generation']:
+            self._reset()
+            return
+        # Drop entries that another process has folded into the workbooks
+        for table, entries in self._pending.items():
+            start = self._checkpoint['offsets'].get(table, 0)
+            self._pending[table] = [(o, e) for o, e in entries if o >= start]
+
+    def _sync(self):
+        self._load_checkpoint()
+        try:
+            size = os.path.getsize(self.journal_path)
+        except FileNotFoundError:
+            size = 0
+        if size < self._offset:
+            self._reset()
+        if size == self._offset:
+            return
+
+        with open(self.journal_path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read(size - self._offset)
+
+        offset = self._offset
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b'\n'):
+                break  # Partially written line; picked up on the next sync
+            self._apply(offset, json.loads(line))
+            offset += len(line)
+        self._offset = offset
+
+    def _apply(self, offset, entry):
+        if entry['op'] == 'batch':
+            for sub_entry in entry['ops']:
+                self._apply(offset, sub_entry)
+            return
+        table = entry['table']
+        if offset < self._checkpoint['offsets'].get(table, 0):
+            return
+        if entry['op'] == 'replace':
+            self._pending[table] = [(offset, entry)]
+        else:
+            self._pending.setdefault(table, []).append((offset, entry))
+
+    def _write(self, make_entry):
+        # make_entry() builds the line under the lock, after every earlier
+        # write has been read back, so updates see the latest rows
+        with self._lock, self._file_lock():
+            # The generation may have moved on while we waited for the lock
+            self._load_checkpoint()
+            self._sync()
+            entry = make_entry()
+            if entry is None:
+                return
+            line = (json.dumps(entry, default=_json_default) + '\n').encode('utf-8')
+            fd = os.open(self.journal_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            self._sync()
+
+    def version(self, table):
+        with self._lock:
+            self._sync()
+            entries = self._pending.get(table, [])
+            try:
+                st = os.stat(table)
+                stamp = (st.st_mtime_ns, st.st_size)
+            except FileNotFoundError:
+                stamp = None
+            return (stamp, self._checkpoint['generation'], len(entries),
+                    entries[-1][0] if entries else None)
+
+    def _materialize(self, table):
+        # The workbook (or the last replace) with later journal entries applied
+        entries = [entry for _, entry in self._pending.get(table, [])]
+        if entries and entries[0]['op'] == 'replace':
+            df = _concat_rows(pd.DataFrame(columns=self.schema.get(table)), entries[0]['rows'])
+            entries = entries[1:]
+        else:
+            df = read_table(table)
+
+        rows = []
+        for entry in entries:
+            if entry['op'] == 'upsert':
+                df = _upsert_frame(_concat_rows(df, rows), entry['key'], entry['value'], entry['values'])
+                rows = []
+            else:
+                rows.extend(entry['rows'])
+        return _concat_rows(df, rows)
+
+    def read(self, table):
+        with self._lock:
+            version = self.version(table)
+            cached = self._frames.get(table)
+            if cached is None or cached[0] != version:
+                cached = self._frames[table] = (version, self._materialize(table))
+            return cached[1].copy()
+
+    def _updated(self, table, column, value, update):
+        # Not find(): that takes _index_lock, which readers hold while
+        # waiting for _lock
+        df = self.read(table)
+        rows = df[df[column] == value] if column in df.columns else df.iloc[:0]
+        return _resolve_update(rows, column, value, update)
+
+    def write_batch(self, ops):
+        # A batch is one journal line, so it is either fully applied or not at all
+        def make_entry():
+            entries = []
+            for op, table, data in ops:
+                if op == 'update':
+                    op, data = 'upsert', self._updated(table, *data)
+                    if data is None:
+                        continue
+                if op == 'upsert':
+                    column, value, values = data
+                    entries.append({'op': op, 'table': table, 'key': column, 'value': value, 'values': values})
+                else:
+                    rows = data.to_dict('records') if op == 'replace' else list(data)
+                    entries.append({'op': op, 'table': table, 'rows': rows})
+            if not entries:
+                return None
+            return entries[0] if len(entries) == 1 else {'op': 'batch', 'ops': entries}
+
+        self._write(make_entry)
+
+    def compact(self):
+        # Fold the journal into the workbooks and start a new, empty generation
+        with self._lock, self._file_lock():
+            self._sync()
+            checkpoint = {
+                'generation': self._checkpoint['generation'],
+                'offsets': dict(self._checkpoint['offsets'])
+            }
+            for table in list(self._pending):
+                if self._pending[table]:
+                    write_workbook(self.read(table), table)
+                checkpoint['offsets'][table] = self._offset
+                write_json(checkpoint, self.checkpoint_path)
+
+            old_journal = self.journal_path
+            write_json({'generation': checkpoint['generation'] + 1, 'offsets': {}},
+                        self.checkpoint_path)
+            self._load_checkpoint()
+            if os.path.exists(old_journal):
+                os.remove(old_journal)
+
+
+class SQLiteStorage(Storage):
+    # One SQLite table per workbook, created from the schema and indexed on
+    # the columns routes look rows up by. Workbooks that already hold data
+    # are imported the first time the database sees their table, and
+    # compact() writes the tables back out as xlsx.
+    INDEXED_COLUMNS = ('OrderID', 'ProductID', 'Email', 'OrderDate', 'Date', 'RetailerID')
+    # Multi-column indexes serving page(): a retailer's rows in date order
+    COMPOSITE_INDEXES = (('RetailerID', 'OrderDate'), ('RetailerID', 'Status', 'OrderDate'))
+
+    def __init__(self, schema, data_dir='data'):
+        super().__init__(schema, data_dir)
+        self.db_path = os.path.join(data_dir, 'nomii.db')
+        self._local = threading.local()
+        self._columns = {}
+        conn = self._connect()
+        with conn:
+            # Serialise first-time setup across workers so imports happen once
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('CREATE TABLE IF NOT EXISTS storage_meta (name TEXT PRIMARY KEY, imported_at TEXT)')
+            conn.execute('CREATE TABLE IF NOT EXISTS sequences (name TEXT PRIMARY KEY, value INTEGER)')
+            conn.execute('CREATE TABLE IF NOT EXISTS table_versions (name TEXT PRIMARY KEY, version INTEGER)')
+            for table, columns in schema.items():
+                self._create_table(conn, table, columns)
+
+    @staticmethod
+    def table_name(table):
+        return os.path.splitext(os.path.basename(table))[0]
+
+    def _connect(self):
+        # One connection per thread and process: a worker forked after
+        # import must not reuse the handle its parent opened
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _create_table(self, conn, table, columns):
+        name = self.table_name(table)
+        column_sql = ', '.join(f'"{c}"' for c in columns)
+        conn.execute(f'CREATE TABLE IF NOT EXISTS "{name}" ({column_sql})')
+        self._columns[table] = [row[1] for row in conn.execute(f'PRAGMA table_info("{name}")')]
+        # Tables created under an older schema gain its new columns
+        self._ensure_columns(conn, table, columns)
+        for column in self.INDEXED_COLUMNS:
+            if column in self._columns[table]:
+                conn.execute(f'CREATE INDEX IF NOT EXISTS "ix_{name}_{column}" ON "{name}" ("{column}")')
+        for index_columns in self.COMPOSITE_INDEXES:
+            if all(c in self._columns[table] for c in index_columns):
+                column_sql = ', '.join(f'"{c}"' for c in index_columns)
+                conn.execute(f'CREATE INDEX IF NOT EXISTS "ix_{name}_{"_".join(index_columns)}" '
+                             f'ON "{name}" ({column_sql})')
+
+        imported = conn.execute('SELECT 1 FROM storage_meta WHERE name = ?', (name,)).fetchone()
+        if not imported:
+            if os.path.exists(table):
+                df = read_table(table)
+                if not df.empty:
+                    self._insert(conn, table, df.to_dict('records'))
+            conn.execute('INSERT INTO storage_meta VALUES (?, ?)', (name, datetime.now().isoformat()))
+
+    def _ensure_columns(self, conn, table, columns):
+        # Workbooks and callers may carry columns the schema does not list
+        if any(c not in self._columns[table] for c in columns):
+            name = self.table_name(table)
+            self._columns[table] = [row[1] for row in conn.execute(f'PRAGMA table_info("{name}")')]
+        for column in columns:
+            if column not in self._columns[table]:
+                conn.execute(f'ALTER TABLE "{self.table_name(table)}" ADD COLUMN "{column}"')
+                self._columns[table].append(column)
+
+    def _insert(self, conn, table, rows):
+        if not rows:
+            return
+        columns = list(dict.fromkeys(c for row in rows for c in row))
+        self._ensure_columns(conn, table, columns)
+        placeholders = ', '.join('?' for _ in columns)
+        column_sql = ', '.join(f'"{c}"' for c in columns)
+        conn.executemany(
+            f'INSERT INTO "{self.table_name(table)}" ({column_sql}) VALUES ({placeholders})',
+            [[_to_sql_value(row.get(c)) for c in columns] for row in rows])
+
+    def _upsert(self, conn, table, column, value, values):
+        self._ensure_columns(conn, table, [column, *values])
+        assignments = ', '.join(f'"{c}" = ?' for c in values)
+        params = [_to_sql_value(v) for v in values.values()] + [_to_sql_value(value)]
+        cursor = conn.execute(
+            f'UPDATE "{self.table_name(table)}" SET {assignments} WHERE "{column}" = ?', params)
+        if cursor.rowcount == 0:
+            self._insert(conn, table, [{column: value, **values}])
+
+    def _query(self, table, where='', params=()):
+        sql = f'SELECT * FROM "{self.table_name(table)}" {where} ORDER BY rowid'
+        return parse_dates(pd.read_sql_query(sql, self._connect(), params=params))
+
+    def read(self, table):
+        return self._query(table)
+
+    def read_since(self, table, position):
+        # Positions are rowids, which only grow while a table is appended to
+        sql = f'SELECT rowid AS _rowid, * FROM "{self.table_name(table)}" WHERE rowid > ? ORDER BY rowid'
+        df = pd.read_sql_query(sql, self._connect(), params=(position,))
+        if not df.empty:
+            position = int(df['_rowid'].iloc[-1])
+        return parse_dates(df.drop(columns='_rowid')), position
+
+    def count(self, table):
+        sql = f'SELECT COUNT(*) FROM "{self.table_name(table)}"'
+        return self._connect().execute(sql).fetchone()[0]
+
+    def last_position(self, table):
+        sql = f'SELECT MAX(rowid) FROM "{self.table_name(table)}"'
+        return self._connect().execute(sql).fetchone()[0] or 0
+
+    def find(self, table, column, value):
+        if column not in self._columns[table]:
+            return self._query(table, 'WHERE 0')
+        if not isinstance(value, (list, tuple, set)):
+            return self._query(table, f'WHERE "{column}" = ?', (_to_sql_value(value),))
+
+        values = [_to_sql_value(v) for v in value]
+        if not values:
+            return self._query(table, 'WHERE 0')
+        # Stay under SQLite's bound-parameter limit
+        chunks = [values[i:i + 500] for i in range(0, len(values), 500)]
+        frames = [self._query(table, f'WHERE "{column}" IN ({", ".join("?" for _ in chunk)})', chunk)
+                  for chunk in chunks]
+        return pd.concat(frames, ignore_index=True)
+
+    def page(self, table, column, value, order_by, after=None, limit=50, columns=None,
+             equals=None, start=None, end=None):
+        # Keyset query on (order_by, rowid): only the page's rows and
+        # columns are read. Dates are compared as the stored ISO text.
+        known = self._columns[table]
+        if column not in known or order_by not in known:
+            return self._query(table, 'WHERE 0'), None
+        selected = [c for c in (columns or known) if c in known]
+        select_sql = ', '.join(f'"{c}"' for c in dict.fromkeys([*selected, order_by]))
+        name = self.table_name(table)
+
+        where = f'"{column}" = ?'
+        params = [_to_sql_value(value)]
+        for key_column, key_value in (equals or {}).items():
+            if key_column not in known:
+                return self._query(table, 'WHERE 0'), None
+            where += f' AND "{key_column}" = ?'
+            params.append(_to_sql_value(key_value))
+        if start is not None:
+            where += f' AND "{order_by}" >= ?'
+            params.append(pd.Timestamp(start).isoformat())
+        if end is not None:
+            where += f' AND "{order_by}" < ?'
+            params.append(pd.Timestamp(end).isoformat())
+
+        select = f'SELECT rowid AS _position, {select_sql} FROM "{name}" WHERE {where}'
+        order = f'ORDER BY "{order_by}" DESC, _position DESC LIMIT ?'
+        if after is None:
+            sql = f'{select} {order}'
+        elif after[0] is None:
+            # Rows without a date come last
+            sql = f'{select} AND "{order_by}" IS NULL AND rowid < ? {order}'
+            params += [after[1]]
+        elif start is not None or end is not None:
+            sql = f'{select} AND ("{order_by}", rowid) < (?, ?) {order}'
+            params += [after[0], after[1]]
+        else:
+            # A range seek on the (column, order_by) index, then the undated rows
+            sql = (f'{select} AND ("{order_by}", rowid) < (?, ?) '
+                   f'UNION ALL {select} AND "{order_by}" IS NULL {order}')
+            params += [after[0], after[1], *params]
+        df = pd.read_sql_query(sql, self._connect(), params=[*params, limit + 1])
+
+        key = None
+        if len(df) > limit:
+            df = df.iloc[:limit]
+            last = df.iloc[-1]
+            key = (None if pd.isna(last[order_by]) else last[order_by], int(last['_position']))
+        return parse_dates(df[selected].reset_index(drop=True)), key
+
+    def scan(self, table, column, value, date_column=None, start=None, end=None, chunk_size=5000):
+        # Streams from one cursor; only chunk_size rows are held at a time
+        if column not in self._columns[table]:
+            return
+        where = f'WHERE "{column}" = ?'
+        params = [_to_sql_value(value)]
+        if date_column is not None and start is not None:
+            where += f' AND "{date_column}" >= ?'
+            params.append(pd.Timestamp(start).isoformat())
+        if date_column is not None and end is not None:
+            where += f' AND "{date_column}" < ?'
+            params.append(pd.Timestamp(end).isoformat())
+        sql = f'SELECT * FROM "{self.table_name(table)}" {where} ORDER BY rowid'
+        for chunk in pd.read_sql_query(sql, self._connect(), params=params, chunksize=chunk_size):
+            yield parse_dates(chunk)
+
+    def version(self, table):
+        # Bumped in the same transaction as every write to the table
+        row = self._connect().execute('SELECT version FROM table_versions WHERE name = ?',
+                                      (self.table_name(table),)).fetchone()
+        return row[0] if row else 0
+
+    def write_batch(self, ops):
+        conn = self._connect()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            for op, table, data in ops:
+                if op == 'replace':
+                    conn.execute(f'DELETE FROM "{self.table_name(table)}"')
+                    self._insert(conn, table, data.to_dict('records'))
+                elif op == 'upsert':
+                    self._upsert(conn, table, *data)
+                elif op == 'update':
+                    # Read on this connection, inside the IMMEDIATE transaction
+                    data = self._updated(table, *data)
+                    if data is not None:
+                        self._upsert(conn, table, *data)
+                else:
+                    self._insert(conn, table, list(data))
+            for name in {self.table_name(table) for _, table, _ in ops}:
+                conn.execute('INSERT INTO table_versions VALUES (?, 1) '
+                             'ON CONFLICT(name) DO UPDATE SET version = version + 1', (name,))
+
+    def reserve_ids(self, table, column, count=1):
+        name = f"{self.table_name(table)}.{column}"
+        conn = self._connect()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT value FROM sequences WHERE name = ?', (name,)).fetchone()
+            if row is not None:
+                last = row[0]
+            else:
+                last = _max_numeric_id(self._query(table)[column])
+            conn.execute('INSERT OR REPLACE INTO sequences VALUES (?, ?)', (name, last + count))
+        return last + 1
+
+    def compact(self):
+        for table in self.schema:
+            self.export_excel(table)
+
+
+BACKENDS = {
+    'excel': ExcelStorage,
+    'journal': JournalStorage,
+    'sqlite': SQLiteStorage
+}
+
+
+def make_storage(schema, backend=None):
+    backend = backend or os.environ.get('NOMII_STORAGE', 'sqlite')
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown storage backend: {backend}")
+    return BACKENDS[backend](schema)
@@ -0,0 +1,196 @@
+import glob
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from atomic_files import atomic_write
+
+# Columns holding timestamps; parsed once at load instead of in every route
+DATE_COLUMNS = ('OrderDate', 'LastUpdate', 'Date')
+
+# Parsed workbooks are also saved as Feather (Arrow IPC) sidecars in this
+# directory next to the workbook, named by the workbook's (mtime, size)
+# stamp, so every process after the first reads Arrow instead of parsing
+# xlsx. Unlike Parquet, Feather keeps datetime units exactly.
+# Set NOMII_SIDECARS=0 to turn them off.
+SIDECAR_DIR = '.cache'
+SIDECARS_ENABLED = os.environ.get('NOMII_SIDECARS', '1') != '0'
+
+# Object columns mixing types (e.g. OrderID 42 next to "O001") cannot be
+# stored in Arrow as they are; they are stored as text plus a per-value
+# type code held in a companion column
+_TYPE_PREFIX = '__type__:'
+_TYPE_CODES = {str: 's', int: 'i', float: 'f', bool: 'b'}
+
+
+def parse_dates(df):
+    for col in DATE_COLUMNS:
+        if col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = pd.to_datetime(df[col], format='ISO8601', errors='coerce')
+    return df
+
+
+def load_workbook(path):
+    return parse_dates(pd.read_excel(path))
+
+
+def sidecar_path(path, stamp):
+    directory, name = os.path.split(path)
+    return os.path.join(directory, SIDECAR_DIR, f"{name}.{stamp[0]}-{stamp[1]}.feather")
+
+
+def _value_code(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return 'n'
+    for kind in type(value).__mro__:
+        if kind in _TYPE_CODES:
+            return _TYPE_CODES[kind]
+    if isinstance(value, (np.integer, np.floating, np.bool_)):
+        return _TYPE_CODES[type(value.item())]
+    raise TypeError(f"Cannot store {type(value).__name__} values in a sidecar")
+
+
+def _encode_mixed(df):
+    out = {}
+    for col in df.columns:
+        series = df[col]
+        if series.dtype == object:
+            codes = series.map(_value_code)
+            if codes[codes != 'n'].nunique() > 1:
+                out[col] = series.astype(str).where(codes != 'n', None)
+                out[f"{_TYPE_PREFIX}{col}"] = codes
+                continue
+        out[col] = series
+    return pd.DataFrame(out, index=df.index)
+
+
+def _decode_mixed(df):
+    for tag in [c for c in df.columns if c.startswith(_TYPE_PREFIX)]:
+        col, codes = tag[len(_TYPE_PREFIX):], df.pop(tag).to_numpy()
+        text = df[col].to_numpy(dtype=object)
+        values = np.full(len(df), None, dtype=object)
+        values[codes == 's'] = text[codes == 's']
+        for code, convert in (('i', int), ('f', float), ('b', lambda v: v == 'True')):
+            mask = codes == code
+            if mask.any():
+                values[mask] = [convert(v) for v in text[mask]]
+        values[codes == 'n'] = np.nan
+        df[col] = pd.Series(values, index=df.index, dtype=object)
+    return df
+
+
+def write_sidecar(path, stamp, df):
+    # Written under a temporary name and renamed, so other processes never
+    # read half a file. Sidecars for older stamps of path are removed.
+    target = sidecar_path(path, stamp)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with atomic_write(target) as tmp:
+        _encode_mixed(df).reset_index(drop=True).to_feather(tmp)
+    pattern = sidecar_path(glob.escape(path), ('*', '*'))
+    for old in glob.glob(pattern):
+        if old != target:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+
+def read_sidecar(path, stamp):
+    # The parsed table saved for this stamp of path, or None
+    target = sidecar_path(path, stamp)
+    if not os.path.exists(target):
+        return None
+    return _decode_mixed(pd.read_feather(target))
+
+
+# In-process cache of parsed workbooks, keyed by file path.
+# An entry stays valid while the file's (mtime, size) stamp is unchanged;
+# writers call put() or invalidate() so their own changes are seen at once.
+# Misses are served from the Feather sidecar for the current stamp when
+# there is one, and the loader (openpyxl) is only used to build it.
+class TableCache:
+    def __init__(self, loader=load_workbook, sidecars=SIDECARS_ENABLED):
+        self._loader = loader
+        self.sidecars = sidecars
+        self._tables = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.sidecar_hits = 0
+
+    @staticmethod
+    def _stamp(path):
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def get(self, path):
+        stamp = self._stamp(path)
+        with self._lock:
+            entry = self._tables.get(path)
+            if entry is not None and entry[0] == stamp:
+                self.hits += 1
+                return entry[1].copy()
+            self.misses += 1
+
+        df = self._load(path, stamp)
+        with self._lock:
+            self._tables[path] = (stamp, df)
+        # Callers are free to mutate what they get back
+        return df.copy()
+
+    def _load(self, path, stamp):
+        if self.sidecars:
+            try:
+                df = read_sidecar(path, stamp)
+                if df is not None:
+                    with self._lock:
+                        self.sidecar_hits += 1
+                    return df
+            except Exception as e:
+                print(f"Error reading sidecar for {path}: {e}")
+        df = self._loader(path)
+        self._save_sidecar(path, stamp, df)
+        return df
+
+    def _save_sidecar(self, path, stamp, df):
+        if self.sidecars:
+            try:
+                write_sidecar(path, stamp, df)
+            except Exception as e:
+                print(f"Error writing sidecar for {path}: {e}")
+
+    def put(self, path, df):
+        # Prime the cache (and the sidecar, for other processes) with a
+        # frame that was just written to path
+        stamp = self._stamp(path)
+        df = df.copy()
+        with self._lock:
+            self._tables[path] = (stamp, df)
+        self._save_sidecar(path, stamp, df)
+
+    def invalidate(self, path=None):
+        with self._lock:
+            if path is None:
+                self._tables.clear()
+            else:
+                self._tables.pop(path, None)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'sidecar_hits': self.sidecar_hits,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'tables': sorted(self._tables)
+            }
+
+
+table_cache = TableCache()
+
+
+def read_table(path):
+    return table_cache.get(path)
@@ -0,0 +1,150 @@
+# page(), scan() and read_since() answer the same questions on every storage
+# backend; each case here is checked against a plain pandas filter and sort
+# of the rows that were written.
+import random
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from storage import BACKENDS
+
+COLUMNS = ['OrderID', 'RetailerID', 'ProductID', 'Quantity', 'OrderDate', 'Status']
+RETAILERS = ['R001', 'R002', 'R003']
+STATUSES = ['Pending', 'Shipped', 'Delivered']
+START = datetime(2024, 1, 1)
+
+
+def make_rows(count, first_id, seed):
+    # Few distinct dates, so many rows tie on OrderDate; some have none
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        date = None if rng.random() < 0.15 else START + timedelta(days=rng.randrange(10), hours=rng.choice([0, 12]))
+        rows.append({
+            'OrderID': f"O{first_id + i:04d}",
+            'RetailerID': rng.choice(RETAILERS),
+            'ProductID': f"P{rng.randrange(1, 6):03d}",
+            'Quantity': rng.randrange(1, 10),
+            'OrderDate': date,
+            'Status': rng.choice(STATUSES)
+        })
+    return rows
+
+
+@pytest.fixture(params=sorted(BACKENDS))
+def orders(request, tmp_path):
+    # (storage, table, rows written) with the rows appended in three batches
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    table = str(data_dir / 'retailer_orders.xlsx')
+    pd.DataFrame(columns=COLUMNS).to_excel(table, index=False)
+    storage = BACKENDS[request.param]({table: COLUMNS}, data_dir=str(data_dir))
+    rows = []
+    for seed in range(3):
+        batch = make_rows(40, len(rows) + 1, seed)
+        storage.append(table, batch)
+        rows += batch
+    return storage, table, rows
+
+
+def expected(rows, retailer, status=None, start=None, end=None):
+    # OrderIDs of the matching rows, latest OrderDate first, undated rows
+    # last and ties broken by write order, later first
+    df = pd.DataFrame(rows)
+    df['OrderDate'] = pd.to_datetime(df['OrderDate'])
+    df = df[df['RetailerID'] == retailer]
+    if status is not None:
+        df = df[df['Status'] == status]
+    if start is not None or end is not None:
+        df = df[df['OrderDate'].notna()]
+    if start is not None:
+        df = df[df['OrderDate'] >= start]
+    if end is not None:
+        df = df[df['OrderDate'] < end]
+    df = df.iloc[::-1].sort_values('OrderDate', ascending=False, na_position='last', kind='stable')
+    return list(df['OrderID'])
+
+
+def all_pages(storage, table, retailer, limit, **kwargs):
+    # Follows the keys from the first page to the last
+    frames, key = [], None
+    while True:
+        df, key = storage.page(table, 'RetailerID', retailer, 'OrderDate', after=key, limit=limit, **kwargs)
+        assert len(df) <= limit
+        frames.append(df)
+        if key is None:
+            return frames
+
+
+@pytest.mark.parametrize('retailer', RETAILERS)
+@pytest.mark.parametrize('limit', [1, 7, 500])
+def test_page_follows_keys(orders, retailer, limit):
+    storage, table, rows = orders
+    frames = all_pages(storage, table, retailer, limit)
+    assert [o for df in frames for o in df['OrderID']] == expected(rows, retailer)
+    assert all(len(df) == limit for df in frames[:-1])
+
+
+@pytest.mark.parametrize('status', STATUSES)
+def test_page_status_filter(orders, status):
+    storage, table, rows = orders
+    frames = all_pages(storage, table, 'R001', 5, equals={'Status': status})
+    assert [o for df in frames for o in df['OrderID']] == expected(rows, 'R001', status=status)
+
+
+@pytest.mark.parametrize('start,end', [
+    (START + timedelta(days=2), START + timedelta(days=6)),
+    (START + timedelta(days=3, hours=12), None),
+    (None, START + timedelta(days=4))
+])
+def test_page_date_range(orders, start, end):
+    storage, table, rows = orders
+    frames = all_pages(storage, table, 'R002', 4, start=start, end=end, equals={'Status': 'Pending'})
+    assert ([o for df in frames for o in df['OrderID']] ==
+            expected(rows, 'R002', status='Pending', start=start, end=end))
+    frames = all_pages(storage, table, 'R002', 4, start=start, end=end)
+    assert [o for df in frames for o in df['OrderID']] == expected(rows, 'R002', start=start, end=end)
+
+
+def test_page_projection(orders):
+    storage, table, rows = orders
+    df, _ = storage.page(table, 'RetailerID', 'R003', 'OrderDate', limit=10,
+                         columns=['OrderID', 'Quantity', 'NoSuchColumn'])
+    assert list(df.columns) == ['OrderID', 'Quantity']
+    quantities = {row['OrderID']: row['Quantity'] for row in rows}
+    assert [int(q) for q in df['Quantity']] == [quantities[o] for o in df['OrderID']]
+
+
+def test_page_unknown_retailer(orders):
+    storage, table, _ = orders
+    df, key = storage.page(table, 'RetailerID', 'R999', 'OrderDate')
+    assert df.empty and key is None
+
+
+@pytest.mark.parametrize('start,end', [(None, None), (START + timedelta(days=1), START + timedelta(days=8))])
+def test_scan(orders, start, end):
+    storage, table, rows = orders
+    chunks = list(storage.scan(table, 'RetailerID', 'R001', 'OrderDate', start, end, chunk_size=4))
+    assert all(len(chunk) <= 4 for chunk in chunks)
+    # Storage order is write order
+    want = [row['OrderID'] for row in rows
+            if row['RetailerID'] == 'R001' and (start is None or (row['OrderDate'] is not None and
+                                                                  start <= row['OrderDate'] < end))]
+    assert [o for chunk in chunks for o in chunk['OrderID']] == want
+
+
+def test_read_since(orders):
+    storage, table, rows = orders
+    position = storage.last_position(table)
+    df, same = storage.read_since(table, position)
+    assert df.empty and same == position
+
+    batch = make_rows(5, len(rows) + 1, seed=99)
+    storage.append(table, batch)
+    df, position = storage.read_since(table, position)
+    assert list(df['OrderID']) == [row['OrderID'] for row in batch]
+    assert position == storage.last_position(table)
+
+    df, _ = storage.read_since(table, 0)
+    assert list(df['OrderID']) == [row['OrderID'] for row in rows + batch]
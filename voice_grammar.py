@@ -0,0 +1,73 @@
+import re
+
+# Parses spoken orders such as "add 5 kg rice, 2 l oil and 10 soap" into
+# items of {'quantity', 'unit', 'name', 'text'}. Quantities may be digits
+# or number words and default to 1; units are optional and normalized.
+
+NUMBER_WORDS = {
+    'a': 1, 'an': 1, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6, 'seven': 7,
+    'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11, 'twelve': 12, 'fifteen': 15, 'twenty': 20
+}
+UNITS = {
+    'kg': 'kg', 'kgs': 'kg', 'kilo': 'kg', 'kilos': 'kg', 'kilogram': 'kg', 'kilograms': 'kg',
+    'g': 'g', 'gm': 'g', 'gms': 'g', 'gram': 'g', 'grams': 'g',
+    'l': 'l', 'ltr': 'l', 'litre': 'l', 'litres': 'l', 'liter': 'l', 'liters': 'l',
+    'ml': 'ml', 'millilitre': 'ml', 'millilitres': 'ml', 'milliliter': 'ml', 'milliliters': 'ml',
+    'packet': ' packet', 'packets': ' packet', 'pack': ' packet', 'packs': ' packet',
+    'pc': ' pc', 'pcs': ' pc', 'piece': ' pc', 'pieces': ' pc'
+}
+VERBS = ('add', 'order', 'buy', 'get', 'send')
+
+
+def _alternatives(words):
+    # Longest first so "kilograms" is not read as "kilo" + "grams"
+    return '|'.join(re.escape(w) for w in sorted(words, key=len, reverse=True))
+
+
+_VERB = rf'(?:please\s+)?(?:i\s+(?:want|need)\s+(?:to\s+)?)?(?:(?:{_alternatives(VERBS)})\b\s*)?'
+_QUANTITY = rf'(?:\d+|(?:{_alternatives(NUMBER_WORDS)})\b)'
+# Commas always separate items; "and", "plus" and "&" only when the next
+# item starts with a quantity or a verb, so "salt and pepper" stays whole
+SEPARATOR_RE = re.compile(rf'\s*[,;]\s*|\s+(?:and|plus|&)\s+(?={_VERB}{_QUANTITY})', re.IGNORECASE)
+# A command starts with a verb or a quantity
+COMMAND_RE = re.compile(rf'^(?:please\s+)?(?:i\s+(?:want|need)\b|(?:{_alternatives(VERBS)})\b|{_QUANTITY})', re.IGNORECASE)
+ITEM_RE = re.compile(
+    rf'^{_VERB}(?:(?P<quantity>{_QUANTITY})\s*(?:(?P<unit>{_alternatives(UNITS)})\b\.?\s*)?(?:of\s+)?)?(?P<name>.+?)'
+    r'(?:\s+(?:to|in|into)\s+(?:my\s+|the\s+)?cart)?(?:\s+please)?$',
+    re.IGNORECASE
+)
+
+
+def parse_voice_order(text):
+    # Returns (items, unparsed): the items understood, in spoken order, and
+    # the pieces of the utterance that were not
+    text = text.strip().rstrip('.!')
+    if not COMMAND_RE.match(text):
+        return [], [text] if text else []
+    items, unparsed = [], []
+    for part in SEPARATOR_RE.split(text):
+        part = part.strip()
+        if not part:
+            continue
+        match = ITEM_RE.match(part)
+        if not match or not re.search('[a-z]', match.group('name'), re.IGNORECASE):
+            unparsed.append(part)
+            continue
+        quantity = match.group('quantity')
+        if quantity is None:
+            quantity = 1
+        elif quantity.isdigit():
+            quantity = int(quantity)
+        else:
+            quantity = NUMBER_WORDS[quantity.lower()]
+        if quantity < 1:
+            unparsed.append(part)
+            continue
+        unit = match.group('unit')
+        items.append({
+            'quantity': quantity,
+            'unit': UNITS[unit.lower()] if unit else '',
+            'name': match.group('name').strip(),
+            'text': part
+        })
+    return items, unparsed
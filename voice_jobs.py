@@ -0,0 +1,193 @@
+import hashlib
+import io
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Speech-to-text backends. Each takes the uploaded audio as bytes and
+# returns the transcript, raising RecognitionError when nothing usable
+# was heard.
+class RecognitionError(Exception):
+    pass
+
+
+class GoogleRecognizer:
+    # speech_recognition's free Google Web Speech endpoint (a network call)
+    def recognize(self, audio):
+        import speech_recognition as sr
+
+        recognizer = sr.Recognizer()
+        try:
+            with sr.AudioFile(io.BytesIO(audio)) as source:
+                audio_data = recognizer.record(source)
+            return recognizer.recognize_google(audio_data)
+        except sr.UnknownValueError:
+            raise RecognitionError("Could not understand audio")
+        except ValueError as e:
+            # Not a WAV/AIFF/FLAC file
+            raise RecognitionError(str(e))
+
+
+class OfflineRecognizer:
+    # Stand-in for tests and offline development: the "audio" is the
+    # transcript itself as UTF-8 text. delay simulates a slow service.
+    def __init__(self, delay=None):
+        self.delay = float(os.environ.get('NOMII_OFFLINE_RECOGNIZER_DELAY', 0)) if delay is None else delay
+
+    def recognize(self, audio):
+        if self.delay:
+            time.sleep(self.delay)
+        try:
+            text = audio.decode('utf-8').strip()
+        except UnicodeDecodeError:
+            raise RecognitionError("Could not understand audio")
+        if not text:
+            raise RecognitionError("Could not understand audio")
+        return text
+
+
+RECOGNIZERS = {
+    'google': GoogleRecognizer,
+    'offline': OfflineRecognizer
+}
+
+
+def make_recognizer(name=None):
+    name = name or os.environ.get('NOMII_RECOGNIZER', 'google')
+    if name not in RECOGNIZERS:
+        raise ValueError(f"Unknown recognizer: {name}")
+    return RECOGNIZERS[name]()
+
+
+def audio_digest(audio):
+    return hashlib.sha256(audio).hexdigest()
+
+
+# Voice orders run in the background so a slow recognition never holds a
+# request worker. Jobs and their results are rows in SQLite, so a job
+# submitted to one worker can be polled through any other. Transcripts are
+# kept by audio hash: an upload that was heard before skips the
+# recognizer, and the same audio sent again for the same cart returns the
+# job already made for it instead of adding the items twice.
+# The threads running the jobs belong to the process that took the upload,
+# so a job whose process died stays queued or running; a poll that finds
+# it untouched for job_timeout_seconds marks it failed.
+class VoiceJobQueue:
+    def __init__(self, path, recognizer, handler, workers=2, job_ttl_hours=24, job_timeout_seconds=120):
+        # handler(transcript, cart_id) applies the order and returns a dict
+        # with the outcome; it runs on the queue's threads
+        self.path = path
+        self.recognizer = recognizer
+        self.handler = handler
+        self.job_ttl = job_ttl_hours * 3600
+        self.job_timeout = job_timeout_seconds
+        self._local = threading.local()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='voice')
+        self.recognitions = 0
+        conn = self._connect()
+        with conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS voice_jobs (id TEXT PRIMARY KEY, owner TEXT, cart_id TEXT, '
+                         'audio_hash TEXT, status TEXT, transcript TEXT, result TEXT, created REAL, updated REAL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_voice_jobs_audio ON voice_jobs (cart_id, audio_hash)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_voice_jobs_created ON voice_jobs (created)')
+            conn.execute('CREATE TABLE IF NOT EXISTS voice_transcripts (audio_hash TEXT PRIMARY KEY, '
+                         'transcript TEXT, created REAL)')
+
+    def _connect(self):
+        # One connection per thread and process: a worker forked after
+        # import must not reuse the handle its parent opened
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def submit(self, owner, cart_id, audio=None, transcript=None):
+        # Queues a voice order from audio bytes or an already known
+        # transcript and returns its job id
+        self.prune()
+        conn = self._connect()
+        audio_hash = audio_digest(audio) if audio is not None else None
+        if audio_hash is not None:
+            row = conn.execute("SELECT id FROM voice_jobs WHERE cart_id = ? AND audio_hash = ? AND status != 'failed'",
+                               (cart_id, audio_hash)).fetchone()
+            if row is not None:
+                return row[0]
+            cached = conn.execute('SELECT transcript FROM voice_transcripts WHERE audio_hash = ?',
+                                  (audio_hash,)).fetchone()
+            if cached is not None:
+                transcript = cached[0]
+
+        job_id = secrets.token_urlsafe(12)
+        now = time.time()
+        with conn:
+            conn.execute("INSERT INTO voice_jobs VALUES (?, ?, ?, ?, 'queued', ?, NULL, ?, ?)",
+                         (job_id, owner, cart_id, audio_hash, transcript, now, now))
+        self._pool.submit(self._run, job_id, cart_id, audio, audio_hash, transcript)
+        return job_id
+
+    def _run(self, job_id, cart_id, audio, audio_hash, transcript):
+        try:
+            if not self._update(job_id, 'running'):
+                return  # Timed out while it waited in the queue
+            if transcript is None:
+                self.recognitions += 1
+                transcript = self.recognizer.recognize(audio)
+                conn = self._connect()
+                with conn:
+                    conn.execute('INSERT OR REPLACE INTO voice_transcripts VALUES (?, ?, ?)',
+                                 (audio_hash, transcript, time.time()))
+            result = self.handler(transcript, cart_id)
+            self._update(job_id, 'done' if result.get('success') else 'failed', transcript, result)
+        except RecognitionError as e:
+            self._update(job_id, 'failed', transcript, {'success': False, 'error': str(e)})
+        except Exception as e:
+            print(f"Error processing voice order: {e}")
+            self._update(job_id, 'failed', transcript, {'success': False, 'error': str(e)})
+
+    def _update(self, job_id, status, transcript=None, result=None):
+        # Only unfinished jobs change, so a job already failed for timing
+        # out keeps that outcome. Returns whether the job was changed.
+        conn = self._connect()
+        with conn:
+            return conn.execute('UPDATE voice_jobs SET status = ?, transcript = COALESCE(?, transcript), '
+                                "result = ?, updated = ? WHERE id = ? AND status IN ('queued', 'running')",
+                                (status, transcript, None if result is None else json.dumps(result),
+                                 time.time(), job_id)).rowcount > 0
+
+    def get(self, job_id, owner):
+        # The job as a dict, or None if it does not exist or is not owner's
+        conn = self._connect()
+        row = conn.execute('SELECT status, transcript, result, updated FROM voice_jobs WHERE id = ? AND owner = ?',
+                           (job_id, owner)).fetchone()
+        if row is None:
+            return None
+        status, transcript, result, updated = row
+        if status in ('queued', 'running') and updated < time.time() - self.job_timeout:
+            status, result = 'failed', json.dumps({'success': False, 'error': 'Voice order timed out'})
+            with conn:
+                changed = conn.execute("UPDATE voice_jobs SET status = ?, result = ?, updated = ? "
+                                       "WHERE id = ? AND status IN ('queued', 'running') AND updated = ?",
+                                       (status, result, time.time(), job_id, updated)).rowcount
+            if not changed:
+                # The job moved on meanwhile
+                return self.get(job_id, owner)
+        job = {'job_id': job_id, 'status': status, 'transcript': transcript}
+        if result is not None:
+            job.update(json.loads(result))
+        return job
+
+    def prune(self):
+        # Jobs and transcripts are kept for job_ttl
+        cutoff = time.time() - self.job_ttl
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM voice_jobs WHERE created < ?', (cutoff,))
+            conn.execute('DELETE FROM voice_transcripts WHERE created < ?', (cutoff,))